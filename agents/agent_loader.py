@@ -1,4 +1,5 @@
 import json
+import re
 from pathlib import Path
 from typing import List, Dict, Any
 import logging
@@ -40,7 +41,7 @@ def carregar_agentes_dinamicamente(path: str = "config/agents_config.json") -> L
 
 def validar_configuracao_agente(config: Dict[str, Any]) -> bool:
     required_fields = ["name", "description", "instructions"]
-    optional_fields = ["plugins", "functions", "settings"]
+    optional_fields = ["plugins", "functions", "settings", "examples", "routing"]
     
     for field in required_fields:
         if field not in config:
@@ -48,6 +49,20 @@ def validar_configuracao_agente(config: Dict[str, Any]) -> bool:
         if not isinstance(config[field], str) or not config[field].strip():
             raise ValueError(f"Campo '{field}' deve ser uma string não vazia")
     
+    routing = config.get("routing")
+    if routing is not None:
+        if not isinstance(routing, dict):
+            raise ValueError("Campo 'routing' deve ser um objeto com 'keywords' e/ou 'patterns'")
+        for field in ("keywords", "patterns"):
+            values = routing.get(field) or []
+            if not isinstance(values, list) or not all(isinstance(v, str) and v.strip() for v in values):
+                raise ValueError(f"Campo 'routing.{field}' deve ser uma lista de strings não vazias")
+        for pattern in routing.get("patterns") or []:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Padrão de roteamento inválido '{pattern}': {e}")
+    
     all_known_fields = required_fields + optional_fields
     for field in config.keys():
         if field not in all_known_fields:
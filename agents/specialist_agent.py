@@ -1,13 +1,18 @@
 from semantic_kernel.agents import ChatCompletionAgent
 from semantic_kernel.connectors.ai.open_ai import OpenAIChatCompletion
+from typing import Optional
 
+from core.http_client import OpenAIClientFactory
 
-def criar_agente_especialista(config: dict, api_key: str) -> ChatCompletionAgent:
+
+def criar_agente_especialista(config: dict, api_key: str, client_factory: Optional[OpenAIClientFactory] = None) -> ChatCompletionAgent:
     # Criar serviço OpenAI para o agente com modelo otimizado
+    # Com client_factory, todos os agentes compartilham o mesmo pool HTTP
     service = OpenAIChatCompletion(
         service_id=f"openai-{config['name'].lower()}",
         ai_model_id="gpt-4.1",  # Modelo mais rápido e eficiente
-        api_key=api_key
+        api_key=api_key,
+        async_client=client_factory.get_async_client() if client_factory else None
     )
     
     return ChatCompletionAgent(
@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from core.memory_manager import SESSION_ID_REGEX  # mesma validação do gerenciador de sessões
+
 API_TITLE = "Sistema de Agentes Especialistas"
 API_DESCRIPTION = "API REST para gerenciar agentes com arquitetura Handoff Orchestration usando Semantic Kernel"
 API_VERSION = "1.0.0"
@@ -12,7 +14,7 @@ BASE_DIR = Path(__file__).parent.parent
 CONFIG_DIR = BASE_DIR / "config"
 AGENTS_CONFIG_FILE = CONFIG_DIR / "agents_config.json"
 GUARDRAILS_CONFIG_FILE = CONFIG_DIR / "guardrails_config.json"
-CHAT_HISTORY_FILE = BASE_DIR / "chat_history.json"
+CHAT_HISTORY_FILE = BASE_DIR / "chat_history.jsonl"
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -20,9 +22,44 @@ LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = "gpt-4"
 
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+GUARDRAIL_SEMANTIC_MODE = os.getenv("GUARDRAIL_SEMANTIC_MODE", "batch")
+GUARDRAIL_PREFILTER_ENABLED = os.getenv("GUARDRAIL_PREFILTER_ENABLED", "false").lower() == "true"
+GUARDRAIL_PREFILTER_THRESHOLD = float(os.getenv("GUARDRAIL_PREFILTER_THRESHOLD", "0.15"))
+# Modelo de embeddings do pré-filtro (chamado pelo cliente assíncrono compartilhado)
+GUARDRAIL_PREFILTER_MODEL = os.getenv("GUARDRAIL_PREFILTER_MODEL", "text-embedding-3-small")
+
+MODERATION_BATCH_WINDOW = float(os.getenv("MODERATION_BATCH_WINDOW", "0.01"))
+MODERATION_MAX_BATCH_SIZE = int(os.getenv("MODERATION_MAX_BATCH_SIZE", "32"))
+
+PREFLIGHT_TIMEOUT = float(os.getenv("PREFLIGHT_TIMEOUT", "10"))
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() == "true"
+SUMMARY_CHUNK_SIZE = int(os.getenv("SUMMARY_CHUNK_SIZE", "20"))
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", "20"))
+
+LOCAL_ROUTER_ENABLED = os.getenv("LOCAL_ROUTER_ENABLED", "true").lower() == "true"
+LOCAL_ROUTER_THRESHOLD = float(os.getenv("LOCAL_ROUTER_THRESHOLD", "0.15"))
+LOCAL_ROUTER_MIN_MARGIN = float(os.getenv("LOCAL_ROUTER_MIN_MARGIN", "0.08"))
+
 MAX_HISTORY_MESSAGES = 1000
 DEFAULT_HISTORY_LIMIT = 50
 
+CONVERSATIONS_DIR = BASE_DIR / "conversations"
+MAX_ACTIVE_SESSIONS = int(os.getenv("MAX_ACTIVE_SESSIONS", "1000"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "1800"))
+HISTORY_ASYNC_WRITES = os.getenv("HISTORY_ASYNC_WRITES", "true").lower() == "true"
+# "jsonl" (um arquivo por sessão) ou "sqlite" (banco único, consultas indexadas)
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "jsonl").lower()
+HISTORY_DB_FILE = Path(os.getenv("HISTORY_DB_FILE", str(BASE_DIR / "conversations.db")))
+
 SYSTEM_NOT_INITIALIZED = "Sistema não inicializado"
 SYSTEM_INITIALIZED_SUCCESS = "Sistema inicializado com sucesso"
 SYSTEM_SHUTDOWN_SUCCESS = "Sistema encerrado com sucesso"
@@ -1,8 +1,9 @@
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
 from typing import List, Optional
 import os
+import json
 import logging
 from dotenv import load_dotenv
 
@@ -11,6 +12,7 @@ from .models import (
     ChatHistoryResponse, SystemStatus, GuardrailConfig, GuardrailResponse
 )
 from .services import AgentService
+from .config import SESSION_ID_REGEX, DEFAULT_HISTORY_LIMIT, MAX_HISTORY_MESSAGES
 
 load_dotenv()
 
@@ -183,7 +185,7 @@ async def send_message(
     start_time = time.time()
     
     try:
-        result = await service.process_message(message.message)
+        result = await service.process_message(message.message, message.session_id)
         return MessageResponse(**result)
     except Exception as e:
         response_time = round(time.time() - start_time, 3)
@@ -194,6 +196,7 @@ async def send_message(
             success=False,
             response=f"Erro ao processar mensagem: {str(e)}",
             agent_name="Sistema",
+            session_id=message.session_id,
             timestamp=datetime.now(),
             response_time_seconds=response_time,
             performance_metrics={
@@ -205,13 +208,37 @@ async def send_message(
         )
 
 
+@app.post("/chat/stream", tags=["Chat"])
+async def stream_message(
+    message: MessageRequest,
+    service: AgentService = Depends(get_agent_service)
+):
+    """
+    Processa a mensagem com Server-Sent Events: preflight, routing, handoff,
+    token (texto parcial do agente) e done (mesmo conteúdo de /chat/send).
+    """
+    async def event_stream():
+        async for event in service.stream_message(message.message, message.session_id):
+            data = json.dumps(event["data"], ensure_ascii=False, default=str)
+            yield f"event: {event['event']}\ndata: {data}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/chat/history", response_model=ChatHistoryResponse, tags=["Chat"])
 async def get_chat_history(
-    limit: Optional[int] = None,
+    limit: int = Query(default=DEFAULT_HISTORY_LIMIT, ge=1, le=MAX_HISTORY_MESSAGES),
+    session_id: Optional[str] = Query(default=None, pattern=SESSION_ID_REGEX),
+    before: Optional[int] = Query(default=None, ge=0, description="Mensagens com id menor que este"),
+    after: Optional[int] = Query(default=None, ge=-1, description="Mensagens com id maior que este"),
     service: AgentService = Depends(get_agent_service)
 ):
     try:
-        history = service.get_chat_history(limit)
+        history = service.get_chat_history(limit, session_id, before=before, after=after)
         return ChatHistoryResponse(**history)
     except Exception as e:
         logger.error(f"Erro ao obter histórico: {e}")
@@ -219,9 +246,12 @@ async def get_chat_history(
 
 
 @app.delete("/chat/history", response_model=AgentResponse, tags=["Chat"])
-async def clear_chat_history(service: AgentService = Depends(get_agent_service)):
+async def clear_chat_history(
+    session_id: Optional[str] = Query(default=None, pattern=SESSION_ID_REGEX),
+    service: AgentService = Depends(get_agent_service)
+):
     try:
-        success = service.clear_history()
+        success = service.clear_history(session_id)
         if success:
             return AgentResponse(
                 success=True,
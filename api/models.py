@@ -2,6 +2,14 @@ from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
+from .config import SESSION_ID_REGEX
+
+
+class AgentRoutingConfig(BaseModel):
+    keywords: List[str] = Field(default_factory=list, description="Palavras-chave que roteiam direto para o agente")
+    patterns: List[str] = Field(default_factory=list, description="Expressões regulares que roteiam direto para o agente")
+    priority: int = Field(default=100, description="Menor valor vence quando vários agentes correspondem")
+
 
 class AgentConfig(BaseModel):
     name: str = Field(..., description="Nome do agente")
@@ -10,6 +18,8 @@ class AgentConfig(BaseModel):
     plugins: Optional[List[str]] = Field(default=None, description="Plugins do agente")
     functions: Optional[List[str]] = Field(default=None, description="Funções do agente")
     settings: Optional[Dict[str, Any]] = Field(default=None, description="Configurações adicionais")
+    examples: Optional[List[str]] = Field(default=None, description="Frases de exemplo usadas pelo roteador local")
+    routing: Optional[AgentRoutingConfig] = Field(default=None, description="Roteamento direto por palavras-chave/padrões")
 
     class Config:
         json_schema_extra = {
@@ -32,11 +42,17 @@ class AgentResponse(BaseModel):
 
 class MessageRequest(BaseModel):
     message: str = Field(..., description="Mensagem a ser enviada", min_length=1)
+    session_id: Optional[str] = Field(
+        default=None,
+        description="Identificador da conversa (isola histórico e roteamento)",
+        pattern=SESSION_ID_REGEX
+    )
     
     class Config:
         json_schema_extra = {
             "example": {
-                "message": "Olá, preciso de ajuda com investimentos"
+                "message": "Olá, preciso de ajuda com investimentos",
+                "session_id": "cliente-123"
             }
         }
 
@@ -45,6 +61,7 @@ class MessageResponse(BaseModel):
     success: bool = Field(..., description="Se a mensagem foi processada")
     response: str = Field(..., description="Resposta do agente")
     agent_name: str = Field(..., description="Nome do agente que respondeu")
+    session_id: Optional[str] = Field(default=None, description="Identificador da conversa")
     timestamp: datetime = Field(..., description="Timestamp da resposta")
     response_time_seconds: Optional[float] = Field(default=None, description="Tempo de resposta em segundos")
     performance_metrics: Optional[Dict[str, Any]] = Field(default=None, description="Métricas detalhadas de performance")
@@ -67,6 +84,7 @@ class MessageResponse(BaseModel):
 
 
 class ChatMessage(BaseModel):
+    id: Optional[int] = Field(default=None, description="Id da mensagem na sessão (cursor para before/after)")
     role: str = Field(..., description="Papel (user, assistant, tool)")
     name: Optional[str] = Field(default=None, description="Nome do agente")
     content: str = Field(..., description="Conteúdo da mensagem")
@@ -76,28 +94,40 @@ class ChatMessage(BaseModel):
 
 class ChatHistoryResponse(BaseModel):
     success: bool = Field(..., description="Se a operação foi bem-sucedida")
-    total_messages: int = Field(..., description="Total de mensagens")
+    total_messages: int = Field(..., description="Quantidade de mensagens nesta resposta (página)")
+    history_size: int = Field(default=0, description="Total de mensagens da sessão, com ids de first_id a first_id + history_size - 1")
+    first_id: int = Field(default=0, description="Id da mensagem mais antiga; avança quando o histórico é limpo (os ids nunca se repetem)")
     messages: List[ChatMessage] = Field(..., description="Lista de mensagens")
+    has_more: bool = Field(default=False, description="Se há mais mensagens na direção pedida")
+    next_before: Optional[int] = Field(default=None, description="Cursor para a página anterior (mensagens mais antigas)")
+    next_after: Optional[int] = Field(default=None, description="Cursor para buscar mensagens novas")
     
     class Config:
         json_schema_extra = {
             "example": {
                 "success": True,
-                "total_messages": 5,
+                "total_messages": 2,
+                "history_size": 43,
+                "first_id": 0,
                 "messages": [
                     {
+                        "id": 41,
                         "role": "user",
                         "name": None,
                         "content": "Olá!",
                         "timestamp": "2025-08-06T10:00:00Z"
                     },
                     {
+                        "id": 42,
                         "role": "assistant",
                         "name": "TriageAgent",
                         "content": "Olá! Como posso ajudá-lo?",
                         "timestamp": "2025-08-06T10:00:01Z"
                     }
-                ]
+                ],
+                "has_more": True,
+                "next_before": 41,
+                "next_after": 42
             }
         }
 
@@ -107,6 +137,8 @@ class SystemStatus(BaseModel):
     total_agents: int = Field(..., description="Total de agentes configurados")
     active_runtime: bool = Field(..., description="Se o runtime está ativo")
     last_message_time: Optional[datetime] = Field(default=None, description="Último timestamp de mensagem")
+    cache_stats: Optional[Dict[str, Any]] = Field(default=None, description="Acertos/erros dos caches de verificação")
+    routing_stats: Optional[Dict[str, Any]] = Field(default=None, description="Latência e fração do roteamento local (fast path)")
 
 
 class GuardrailConfig(BaseModel):
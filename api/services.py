@@ -1,32 +1,103 @@
+import asyncio
 import os
 import sys
 import json
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from datetime import datetime
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from agents.agent_loader import carregar_agentes_dinamicamente, salvar_configuracao_agentes, validar_configuracao_agente
 from orchestrator.triage_agent import TriageAgent
+from core.memory_manager import ConversationMemoryManager
+from core.persistence import PersistenceWorker
+from core.sqlite_store import ConversationDatabase
+from core.config_registry import ConfigRegistry
+from core.http_client import OpenAIClientFactory
+from core.semantic_prefilter import SemanticPrefilter, OpenAIEmbedder
+from api.config import (
+    CHAT_HISTORY_FILE, CONVERSATIONS_DIR, MAX_ACTIVE_SESSIONS, SESSION_IDLE_TIMEOUT, HISTORY_ASYNC_WRITES,
+    HISTORY_BACKEND, HISTORY_DB_FILE, DEFAULT_HISTORY_LIMIT,
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY, HTTP_TIMEOUT, HTTP2_ENABLED,
+    GUARDRAIL_SEMANTIC_MODE, GUARDRAIL_PREFILTER_ENABLED, GUARDRAIL_PREFILTER_THRESHOLD, GUARDRAIL_PREFILTER_MODEL,
+    MODERATION_BATCH_WINDOW, MODERATION_MAX_BATCH_SIZE, PREFLIGHT_TIMEOUT,
+    LOCAL_ROUTER_ENABLED, LOCAL_ROUTER_THRESHOLD, LOCAL_ROUTER_MIN_MARGIN,
+    CONTEXT_TOKEN_BUDGET, SUMMARY_ENABLED, SUMMARY_CHUNK_SIZE, SUMMARY_KEEP_RECENT
+)
 from semantic_kernel.contents import ChatMessageContent
 import logging
 
 logger = logging.getLogger(__name__)
 
 SYSTEM_NOT_INITIALIZED = "Sistema não inicializado"
+AGENTS_CONFIG_PATH = "config/agents_config.json"
+GUARDRAILS_CONFIG_PATH = "config/guardrails_config.json"
+
+
+def _carregar_guardrails(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
 class AgentService:
     
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.triage_agent: Optional[TriageAgent] = None
+        self._cleanup_task = None
+        # Escritas do histórico em uma thread dedicada (o request nunca espera o disco)
+        self.persistence = PersistenceWorker() if HISTORY_ASYNC_WRITES else None
+        self.database = ConversationDatabase(str(HISTORY_DB_FILE)) if HISTORY_BACKEND == "sqlite" else None
+        self.conversations = ConversationMemoryManager(
+            base_dir=str(CONVERSATIONS_DIR),
+            max_active_sessions=MAX_ACTIVE_SESSIONS,
+            idle_timeout=SESSION_IDLE_TIMEOUT,
+            default_file=str(CHAT_HISTORY_FILE),
+            persistence=self.persistence,
+            database=self.database
+        )
+        self.client_factory = OpenAIClientFactory(
+            api_key=api_key,
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            timeout=HTTP_TIMEOUT,
+            http2=HTTP2_ENABLED
+        )
+        # Configurações em memória, indexadas por nome (relidas só se o arquivo mudar)
+        self.agents_registry = ConfigRegistry(AGENTS_CONFIG_PATH, carregar_agentes_dinamicamente)
+        self.guardrails_registry = ConfigRegistry(GUARDRAILS_CONFIG_PATH, _carregar_guardrails, missing_ok=True)
         self._initialize_system()
     
     def _initialize_system(self):
         try:
-            agentes_config = carregar_agentes_dinamicamente()
-            self.triage_agent = TriageAgent(agentes_config, self.api_key)
+            agentes_config = self.agents_registry.items()
+            self.triage_agent = TriageAgent(
+                agentes_config,
+                self.api_key,
+                conversations=self.conversations,
+                client_factory=self.client_factory,
+                context_budget=CONTEXT_TOKEN_BUDGET
+            )
+            self.triage_agent.guardrails.semantic_mode = GUARDRAIL_SEMANTIC_MODE
+            if GUARDRAIL_PREFILTER_ENABLED:
+                embedder = OpenAIEmbedder(self.client_factory.get_async_client(), model=GUARDRAIL_PREFILTER_MODEL)
+                self.triage_agent.guardrails.enable_prefilter(
+                    SemanticPrefilter(embedder, threshold=GUARDRAIL_PREFILTER_THRESHOLD)
+                )
+            self.triage_agent.moderator.batch_window = MODERATION_BATCH_WINDOW
+            self.triage_agent.moderator.max_batch_size = MODERATION_MAX_BATCH_SIZE
+            self.triage_agent.preflight.timeout = PREFLIGHT_TIMEOUT
+            if LOCAL_ROUTER_ENABLED:
+                self.triage_agent.router.threshold = LOCAL_ROUTER_THRESHOLD
+                self.triage_agent.router.min_margin = LOCAL_ROUTER_MIN_MARGIN
+            else:
+                self.triage_agent.router = None
+            if SUMMARY_ENABLED:
+                self.triage_agent.summarizer.chunk_size = SUMMARY_CHUNK_SIZE
+                self.triage_agent.summarizer.keep_recent = SUMMARY_KEEP_RECENT
+            else:
+                self.triage_agent.summarizer = None
             self.triage_agent.iniciar_runtime()
             logger.info("Sistema de agentes inicializado com sucesso")
         except Exception as e:
@@ -35,18 +106,14 @@ class AgentService:
     
     def get_all_agents(self) -> List[Dict[str, Any]]:
         try:
-            return carregar_agentes_dinamicamente()
+            return self.agents_registry.items()
         except Exception as e:
             logger.error(f"Erro ao carregar agentes: {e}")
             raise
     
     def get_agent_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         try:
-            agentes = carregar_agentes_dinamicamente()
-            for agente in agentes:
-                if agente["name"] == name:
-                    return agente
-            return None
+            return self.agents_registry.get(name)
         except Exception as e:
             logger.error(f"Erro ao buscar agente {name}: {e}")
             raise
@@ -61,20 +128,19 @@ class AgentService:
             if len(agent_config.get("name", "")) > 50:
                 raise ValueError("Nome do agente muito longo (máximo 50 caracteres)")
             
-            agentes = carregar_agentes_dinamicamente()
-            
-            for agente in agentes:
-                if agente["name"] == agent_config["name"]:
-                    raise ValueError(f"Agente com nome '{agent_config['name']}' já existe")
+            if agent_config["name"] in self.agents_registry:
+                raise ValueError(f"Agente com nome '{agent_config['name']}' já existe")
             
+            agentes = self.agents_registry.items()
             if len(agentes) >= 10:
                 raise ValueError("Número máximo de agentes atingido (10)")
             
             agentes.append(agent_config)
             
-            salvar_configuracao_agentes(agentes)
+            salvar_configuracao_agentes(agentes, AGENTS_CONFIG_PATH)
+            self.agents_registry.update(agentes)
             
-            self._reinitialize_system()
+            self._apply_agents_config(agentes)
             
             logger.info(f"Agente '{agent_config['name']}' criado com sucesso")
             return agent_config
@@ -87,7 +153,7 @@ class AgentService:
         try:
             validar_configuracao_agente(agent_config)
             
-            agentes = carregar_agentes_dinamicamente()
+            agentes = self.agents_registry.items()
             
             found = False
             for i, agente in enumerate(agentes):
@@ -99,9 +165,10 @@ class AgentService:
             if not found:
                 raise ValueError(f"Agente '{name}' não encontrado")
             
-            salvar_configuracao_agentes(agentes)
+            salvar_configuracao_agentes(agentes, AGENTS_CONFIG_PATH)
+            self.agents_registry.update(agentes)
             
-            self._reinitialize_system()
+            self._apply_agents_config(agentes)
             
             logger.info(f"Agente '{name}' atualizado com sucesso")
             return agent_config
@@ -116,16 +183,17 @@ class AgentService:
             if name == "TriageAgent":
                 raise ValueError("Não é possível remover o TriageAgent")
             
-            agentes = carregar_agentes_dinamicamente()
+            agentes = self.agents_registry.items()
             
             agentes_filtrados = [agente for agente in agentes if agente["name"] != name]
             
             if len(agentes_filtrados) == len(agentes):
                 raise ValueError(f"Agente '{name}' não encontrado")
             
-            salvar_configuracao_agentes(agentes_filtrados)
+            salvar_configuracao_agentes(agentes_filtrados, AGENTS_CONFIG_PATH)
+            self.agents_registry.update(agentes_filtrados)
             
-            self._reinitialize_system()
+            self._apply_agents_config(agentes_filtrados)
             
             logger.info(f"Agente '{name}' removido com sucesso")
             return True
@@ -134,7 +202,7 @@ class AgentService:
             logger.error(f"Erro ao remover agente {name}: {e}")
             raise
     
-    async def process_message(self, message: str) -> Dict[str, Any]:
+    async def process_message(self, message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
         import time
         start_time = time.time()
         
@@ -142,42 +210,13 @@ class AgentService:
             if not self.triage_agent:
                 raise RuntimeError(SYSTEM_NOT_INITIALIZED)
             
-            response = await self.triage_agent.processar_mensagem(message)
+            response = await self.triage_agent.processar_mensagem(message, session_id)
             
             # Calcular tempo de resposta
             end_time = time.time()
             response_time = round(end_time - start_time, 3)
             
-            # Verificar se a resposta é de bloqueio por guardrails ou moderação
-            is_blocked_message = (
-                "bloqueada por regras de segurança" in response or
-                "Conteúdo sensível detectado" in response or
-                "⛔" in response or
-                "⚠️" in response
-            )
-            
-            if is_blocked_message:
-                # Para mensagens bloqueadas, usar a resposta diretamente sem buscar no histórico
-                agent_name = "Sistema"
-                agent_response = response
-            else:
-                # Para mensagens normais, buscar o agente que respondeu no histórico
-                historico = self.triage_agent.obter_historico()
-                
-                agent_name = "Sistema"
-                agent_response = response  
-                
-                for msg in reversed(historico):
-                    if (hasattr(msg, 'role') and 
-                        msg.role.value == "assistant" and 
-                        msg.name and 
-                        msg.name != "Sistema" and
-                        hasattr(msg, 'content') and 
-                        msg.content):
-                        
-                        agent_name = msg.name
-                        agent_response = msg.content
-                        break
+            agent_name, agent_response = self._resolve_agent_response(response, session_id)
             
             # Log da performance
             logger.info(f"⏱️ Tempo de resposta: {response_time}s | Agente: {agent_name} | Mensagem: {message[:50]}...")
@@ -186,12 +225,14 @@ class AgentService:
                 "success": True,
                 "response": agent_response,
                 "agent_name": agent_name,
+                "session_id": session_id,
                 "timestamp": datetime.now(),
                 "response_time_seconds": response_time,
                 "performance_metrics": {
                     "total_time": response_time,
                     "agent_used": agent_name,
-                    "message_length": len(message)
+                    "message_length": len(message),
+                    **self.triage_agent.obter_metricas(session_id)
                 }
             }
             
@@ -204,6 +245,7 @@ class AgentService:
                 "success": False,
                 "response": f"Erro ao processar mensagem: {str(e)}",
                 "agent_name": "Sistema",
+                "session_id": session_id,
                 "timestamp": datetime.now(),
                 "response_time_seconds": response_time,
                 "performance_metrics": {
@@ -214,31 +256,122 @@ class AgentService:
                 }
             }
     
-    def get_chat_history(self, limit: Optional[int] = None) -> Dict[str, Any]:
+    def _resolve_agent_response(self, response: str, session_id: Optional[str]) -> tuple:
+        """Identifica qual agente respondeu (nome, conteúdo)"""
+        # Verificar se a resposta é de bloqueio por guardrails ou moderação
+        is_blocked_message = (
+            "bloqueada por regras de segurança" in response or
+            "Conteúdo sensível detectado" in response or
+            "⛔" in response or
+            "⚠️" in response
+        )
+        
+        if is_blocked_message:
+            # Para mensagens bloqueadas, usar a resposta diretamente sem buscar no histórico
+            return "Sistema", response
+        
+        # Para mensagens normais, buscar o agente que respondeu no histórico
+        historico = self.triage_agent.obter_historico(session_id)
+        
+        for msg in reversed(historico):
+            if (hasattr(msg, 'role') and 
+                msg.role.value == "assistant" and 
+                msg.name and 
+                msg.name != "Sistema" and
+                hasattr(msg, 'content') and 
+                msg.content):
+                
+                return msg.name, msg.content
+        
+        return "Sistema", response
+    
+    async def stream_message(self, message: str, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Versão em streaming de process_message: repassa os eventos e finaliza com 'done'"""
+        import time
+        start_time = time.time()
+        first_event_time = None
+        
         try:
             if not self.triage_agent:
                 raise RuntimeError(SYSTEM_NOT_INITIALIZED)
             
-            historico = self.triage_agent.obter_historico()
+            async for event in self.triage_agent.processar_mensagem_stream(message, session_id):
+                if first_event_time is None:
+                    first_event_time = round(time.time() - start_time, 3)
+                
+                if event["event"] != "done":
+                    yield event
+                    continue
+                
+                response_time = round(time.time() - start_time, 3)
+                agent_name, agent_response = self._resolve_agent_response(event["data"]["response"], session_id)
+                logger.info(f"⏱️ Streaming: primeiro evento {first_event_time}s | Total: {response_time}s | Agente: {agent_name}")
+                
+                yield {
+                    "event": "done",
+                    "data": {
+                        "success": True,
+                        "response": agent_response,
+                        "agent_name": agent_name,
+                        "session_id": session_id,
+                        "timestamp": datetime.now().isoformat(),
+                        "response_time_seconds": response_time,
+                        "performance_metrics": {
+                            "total_time": response_time,
+                            "time_to_first_event": first_event_time,
+                            "agent_used": agent_name,
+                            "message_length": len(message),
+                            **self.triage_agent.obter_metricas(session_id)
+                        }
+                    }
+                }
+        
+        except Exception as e:
+            response_time = round(time.time() - start_time, 3)
+            logger.error(f"⏱️ Erro no streaming após {response_time}s | Mensagem: {message[:50]}... | Erro: {e}")
+            yield {
+                "event": "error",
+                "data": {
+                    "success": False,
+                    "response": f"Erro ao processar mensagem: {str(e)}",
+                    "agent_name": "Sistema",
+                    "session_id": session_id,
+                    "response_time_seconds": response_time
+                }
+            }
+    
+    def get_chat_history(self, limit: int = DEFAULT_HISTORY_LIMIT, session_id: Optional[str] = None,
+                         before: Optional[int] = None, after: Optional[int] = None) -> Dict[str, Any]:
+        try:
+            if not self.triage_agent:
+                raise RuntimeError(SYSTEM_NOT_INITIALIZED)
+            
+            # Mensagens sem conteúdo já são puladas na página, sem encurtá-la
+            page, has_more, next_before, next_after = self.triage_agent.obter_pagina_historico(
+                session_id, limit, before=before, after=after
+            )
+            history_size = self.triage_agent.tamanho_historico(session_id)
+            first_id = self.triage_agent.primeiro_id_historico(session_id)
             
             messages = []
-            for msg in historico:
-                if hasattr(msg, 'content') and msg.content:
-                    messages.append({
-                        "role": msg.role.value if hasattr(msg.role, 'value') else str(msg.role),
-                        "name": msg.name,
-                        "content": msg.content,
-                        "timestamp": datetime.now(), 
-                        "ai_model_id": getattr(msg, 'ai_model_id', None)
-                    })
-            
-            if limit:
-                messages = messages[-limit:]
+            for message_id, msg in page:
+                messages.append({
+                    "id": message_id,
+                    "role": msg.role.value,
+                    "name": msg.name,
+                    "content": msg.content,
+                    "timestamp": self._message_time(msg)
+                })
             
             return {
                 "success": True,
                 "total_messages": len(messages),
-                "messages": messages
+                "history_size": history_size,
+                "first_id": first_id,
+                "messages": messages,
+                "has_more": has_more,
+                "next_before": next_before,
+                "next_after": next_after
             }
             
         except Exception as e:
@@ -246,15 +379,16 @@ class AgentService:
             return {
                 "success": False,
                 "total_messages": 0,
+                "history_size": 0,
                 "messages": []
             }
     
-    def clear_history(self) -> bool:
+    def clear_history(self, session_id: Optional[str] = None) -> bool:
         try:
             if not self.triage_agent:
                 raise RuntimeError(SYSTEM_NOT_INITIALIZED)
             
-            self.triage_agent.limpar_historico()
+            self.triage_agent.limpar_historico(session_id)
             logger.info("Histórico limpo com sucesso")
             return True
             
@@ -264,19 +398,19 @@ class AgentService:
     
     def get_system_status(self) -> Dict[str, Any]:
         try:
-            agentes = carregar_agentes_dinamicamente()
+            total_agents = len(self.agents_registry)
             
-            last_message_time = None
-            if self.triage_agent:
-                historico = self.triage_agent.obter_historico()
-                if historico:
-                    last_message_time = datetime.now()  # Simplificado
+            # Só consulta as sessões já em memória: o status não carrega nem descarrega sessões
+            last_timestamp = self.conversations.last_message_time()
+            last_message_time = datetime.fromtimestamp(last_timestamp) if last_timestamp else None
             
             return {
                 "status": "active" if self.triage_agent and self.triage_agent.runtime else "inactive",
-                "total_agents": len(agentes),
+                "total_agents": total_agents,
                 "active_runtime": bool(self.triage_agent and self.triage_agent.runtime),
-                "last_message_time": last_message_time
+                "last_message_time": last_message_time,
+                "cache_stats": self._get_cache_stats(),
+                "routing_stats": self.triage_agent.router.stats() if self.triage_agent and self.triage_agent.router else None
             }
             
         except Exception as e:
@@ -288,6 +422,38 @@ class AgentService:
                 "last_message_time": None
             }
     
+    @staticmethod
+    def _message_time(message) -> Optional[datetime]:
+        """Horário gravado com a mensagem (históricos antigos não têm)"""
+        return datetime.fromtimestamp(message.timestamp) if message.timestamp else None
+    
+    def _get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        if not self.triage_agent:
+            return None
+        return {
+            "semantic_guardrails": self.triage_agent.guardrails.cache_stats()
+        }
+    
+    def _apply_agents_config(self, agentes: List[Dict[str, Any]]) -> None:
+        """Aplica a nova configuração de agentes sem recriar o runtime"""
+        if not self.triage_agent:
+            self._initialize_system()
+            return
+        
+        try:
+            self.triage_agent.aplicar_configuracao(agentes)
+        except Exception as e:
+            logger.error(f"Erro na reconfiguração incremental, reinicializando sistema: {e}")
+            self._reinitialize_system()
+    
+    def _apply_guardrails_config(self, guardrails: List[Dict[str, Any]]) -> None:
+        """Troca atomicamente o conjunto de guardrails ativo"""
+        if not self.triage_agent:
+            self._initialize_system()
+            return
+        
+        self.triage_agent.guardrails.reload(guardrails)
+    
     def _reinitialize_system(self):
         try:
             if self.triage_agent and self.triage_agent.runtime:
@@ -308,8 +474,17 @@ class AgentService:
     
     async def cleanup(self):
         try:
+            if self._cleanup_task:
+                await self._cleanup_task
             if self.triage_agent and self.triage_agent.runtime:
                 await self.triage_agent.parar_runtime()
+            if self.persistence:
+                await asyncio.to_thread(self.persistence.stop)
+            if self.triage_agent:
+                self.triage_agent.conversations.flush_all()
+            if self.database:
+                self.database.close()
+            await self.client_factory.aclose()
             logger.info("Sistema limpo com sucesso")
         except Exception as e:
             logger.error(f"Erro durante cleanup: {e}")
@@ -318,26 +493,14 @@ class AgentService:
     
     def get_all_guardrails(self) -> List[Dict[str, Any]]:
         try:
-            import json
-            from pathlib import Path
-            
-            guardrails_file = Path("config/guardrails_config.json")
-            if not guardrails_file.exists():
-                return []
-            
-            with open(guardrails_file, "r", encoding="utf-8") as f:
-                return json.load(f)
+            return self.guardrails_registry.items()
         except Exception as e:
             logger.error(f"Erro ao carregar guardrails: {e}")
             raise
     
     def get_guardrail_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         try:
-            guardrails = self.get_all_guardrails()
-            for guardrail in guardrails:
-                if guardrail["name"] == name:
-                    return guardrail
-            return None
+            return self.guardrails_registry.get(name)
         except Exception as e:
             logger.error(f"Erro ao buscar guardrail {name}: {e}")
             raise
@@ -350,11 +513,10 @@ class AgentService:
             if len(guardrail_config.get("name", "")) > 50:
                 raise ValueError("Nome do guardrail muito longo (máximo 50 caracteres)")
             
-            guardrails = self.get_all_guardrails()
+            if guardrail_config["name"] in self.guardrails_registry:
+                raise ValueError(f"Guardrail com nome '{guardrail_config['name']}' já existe")
             
-            for guardrail in guardrails:
-                if guardrail["name"] == guardrail_config["name"]:
-                    raise ValueError(f"Guardrail com nome '{guardrail_config['name']}' já existe")
+            guardrails = self.get_all_guardrails()
             
             # Limitar número máximo de guardrails
             if len(guardrails) >= 20:
@@ -367,7 +529,7 @@ class AgentService:
             
             self._save_guardrails_config(guardrails)
             
-            self._reinitialize_system()
+            self._apply_guardrails_config(guardrails)
             
             logger.info(f"Guardrail '{guardrail_config['name']}' criado com sucesso")
             return guardrail_config
@@ -394,7 +556,7 @@ class AgentService:
         
             self._save_guardrails_config(guardrails)
             
-            self._reinitialize_system()
+            self._apply_guardrails_config(guardrails)
             
             logger.info(f"Guardrail '{name}' atualizado com sucesso")
             return guardrail_config
@@ -414,7 +576,7 @@ class AgentService:
             
             self._save_guardrails_config(guardrails_filtrados)
             
-            self._reinitialize_system()
+            self._apply_guardrails_config(guardrails_filtrados)
             
             logger.info(f"Guardrail '{name}' removido com sucesso")
             return True
@@ -425,14 +587,12 @@ class AgentService:
     
     def _save_guardrails_config(self, guardrails: List[Dict[str, Any]]) -> None:
         try:
-            import json
-            from pathlib import Path
-            
-            config_path = Path("config/guardrails_config.json")
+            config_path = Path(GUARDRAILS_CONFIG_PATH)
             config_path.parent.mkdir(parents=True, exist_ok=True)
             
             with open(config_path, "w", encoding="utf-8") as f:
                 json.dump(guardrails, f, ensure_ascii=False, indent=2)
+            self.guardrails_registry.update(guardrails)
             
             logger.info(f"Configuração de {len(guardrails)} guardrails salva")
             
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigRegistry:
+    """
+    Cópia em memória de um arquivo de configuração (lista de itens com "name"),
+    indexada por nome. As leituras são consultas em memória; o arquivo só é
+    relido quando o mtime muda (verificado no máximo a cada `check_interval`
+    segundos) ou depois de invalidate(). As escritas do CRUD atualizam a cópia
+    diretamente com update().
+    """
+
+    def __init__(self, path: str, loader: Callable[[str], List[Dict[str, Any]]],
+                 missing_ok: bool = False, check_interval: float = 1.0):
+        self.path = Path(path)
+        self.loader = loader
+        self.missing_ok = missing_ok
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._items: Optional[List[Dict[str, Any]]] = None
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _ensure_loaded(self) -> None:
+        now = time.monotonic()
+        if self._items is not None and now - self._checked_at < self.check_interval:
+            return
+
+        with self._lock:
+            signature = self._file_signature()
+            self._checked_at = now
+            if self._items is not None and signature == self._signature:
+                return
+
+            if signature is None and self.missing_ok:
+                items = []
+            else:
+                items = self.loader(str(self.path))
+            self._set(items, signature)
+            self.reloads += 1
+            logger.debug(f"[CONFIG] {self.path} carregado ({len(items)} itens)")
+
+    def _set(self, items: List[Dict[str, Any]], signature) -> None:
+        self._by_name = {item["name"]: item for item in items}
+        self._items = items
+        self._signature = signature
+
+    def items(self) -> List[Dict[str, Any]]:
+        """Cópia da lista (quem altera a lista não afeta o registro)"""
+        self._ensure_loaded()
+        return list(self._items)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        return self._by_name.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._items)
+
+    def update(self, items: List[Dict[str, Any]]) -> None:
+        """Registra o conteúdo recém-gravado no arquivo, sem relê-lo"""
+        with self._lock:
+            self._set(list(items), self._file_signature())
+            self._checked_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._items = None
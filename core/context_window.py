@@ -0,0 +1,127 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .entities import EntityStore
+from .tokenizer import TokenCounter, get_token_counter
+
+ENTITIES_HEADER = "\nINFORMAÇÕES IMPORTANTES JÁ FORNECIDAS:\n"
+SUMMARY_HEADER = "RESUMO DA CONVERSA ANTERIOR:\n"
+# Abaixo disso não vale a pena incluir um trecho truncado da mensagem
+MIN_PARTIAL_TOKENS = 24
+
+
+def empacotar(entries: Iterable[Tuple[str, int]], budget: int, counter: TokenCounter) -> Tuple[List[str], int]:
+    """
+    Seleciona, da mais recente para a mais antiga, as linhas (texto, tokens) que
+    cabem no orçamento; a primeira que não cabe entra truncada se sobrar espaço.
+    Retorna as linhas em ordem cronológica e o total de tokens usados.
+    """
+    selected: List[str] = []
+    used = 0
+    for line, tokens in entries:
+        remaining = budget - used
+        if tokens <= remaining:
+            selected.append(line)
+            used += tokens
+            continue
+        if remaining >= MIN_PARTIAL_TOKENS:
+            selected.append(counter.truncate(line, remaining - 1))
+            used = budget
+        break
+    selected.reverse()
+    return selected, used
+
+
+class ContextWindow:
+    """
+    Janela deslizante do contexto enviado aos agentes: guarda as mensagens já
+    formatadas (e com tokens contados) em um deque limitado, O(1) por mensagem,
+    e monta o resumo dentro de um orçamento de tokens, reaproveitando o
+    resultado enquanto nada muda.
+    """
+
+    def __init__(self, entities: Optional[EntityStore] = None, max_messages: int = 200,
+                 max_message_tokens: int = 400, counter: Optional[TokenCounter] = None):
+        self.entities = entities
+        self.max_message_tokens = max_message_tokens
+        self.counter = counter or get_token_counter()
+        self.entries: deque = deque(maxlen=max_messages)
+        self.total_messages = 0
+        self.summary_text = ""
+        self.summarized_until = 0
+        self.last_stats: Dict = {}
+        self._version = 0
+        self._cached_key = None
+        self._cached_summary = ""
+
+    def format_message(self, message) -> str:
+        role = "Usuário" if message.role.value == "user" else f"Assistente({message.name or 'Sistema'})"
+        content = self.counter.truncate(str(message.content), self.max_message_tokens)
+        return f"- {role}: {content}"
+
+    def add_message(self, message) -> None:
+        line = self.format_message(message)
+        self.entries.append((self.total_messages, line, self.counter.count(line) + 1))
+        self.total_messages += 1
+        self._version += 1
+
+    def start_at(self, position: int) -> None:
+        """As próximas mensagens começam em `position` (as anteriores ficaram só no disco)"""
+        self.total_messages = position
+        self._version += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.total_messages = 0
+        self.summary_text = ""
+        self.summarized_until = 0
+        self._version += 1
+
+    def set_summary(self, text: str, summarized_until: int) -> None:
+        """Resumo das mensagens antigas; as mensagens anteriores a `summarized_until` deixam de ser enviadas"""
+        self.summary_text = text
+        self.summarized_until = summarized_until
+        self._version += 1
+
+    def summary(self, budget: int = 1500) -> str:
+        """Resumo com as mensagens mais recentes e as entidades, limitado a `budget` tokens"""
+        entities_version = self.entities.version if self.entities else 0
+        key = (self._version, entities_version, budget)
+        if key == self._cached_key:
+            return self._cached_summary
+
+        if self.total_messages <= 1:
+            summary = "[CONTEXTO: Primeira interação]"
+            lines, used = [], self.counter.count(summary)
+        else:
+            header = "[CONTEXTO DA CONVERSA:\n"
+            used = self.counter.count(header) + 1
+
+            # Entidades têm prioridade: são curtas e evitam perguntar de novo o que já foi dito
+            important_info = self.entities.summary() if self.entities else ""
+            entities_block = ""
+            if important_info:
+                entities_block = f"{ENTITIES_HEADER}{important_info}\n"
+                entities_tokens = self.counter.count(entities_block)
+                if used + entities_tokens > budget:
+                    entities_block = self.counter.truncate(entities_block, max(budget - used, 0))
+                    entities_tokens = budget - used
+                used += entities_tokens
+
+            summary_block = ""
+            if self.summary_text:
+                summary_block = self.counter.truncate(f"{SUMMARY_HEADER}{self.summary_text}\n\n", max(budget - used, 0))
+                used += self.counter.count(summary_block)
+
+            recent = (
+                (line, tokens) for index, line, tokens in reversed(self.entries)
+                if index >= self.summarized_until
+            )
+            lines, lines_tokens = empacotar(recent, budget - used, self.counter)
+            used += lines_tokens
+            summary = header + summary_block + "\n".join(lines) + "\n" + entities_block + "]"
+
+        self.last_stats = {"tokens": used, "budget": budget, "messages": len(lines)}
+        self._cached_key = key
+        self._cached_summary = summary
+        return summary
@@ -0,0 +1,71 @@
+import re
+from collections import OrderedDict
+from typing import List, Optional
+
+# Padrões compilados uma única vez no carregamento do módulo
+FLIGHT_PATTERN = re.compile(r"\b[A-Z]{2}\d{3,4}\b")
+SEAT_PATTERN = re.compile(r"\b\d{1,2}[A-F]\b")
+CANCEL_PATTERN = re.compile(r"cancelar|cancelamento")
+CHANGE_PATTERN = re.compile(r"trocar|mudar|alterar")
+
+
+class EntityStore:
+    """
+    Informações importantes já mencionadas na conversa (voos, assentos,
+    solicitações). Extraídas uma vez por mensagem, no add_message; a leitura
+    do resumo é O(1) enquanto nada muda.
+    """
+
+    def __init__(self, max_entities: int = 50):
+        self.max_entities = max_entities
+        self._entities: "OrderedDict[str, None]" = OrderedDict()
+        self._summary: Optional[str] = ""
+        # Incrementado a cada mudança (usado por quem guarda o resumo em cache)
+        self.version = 0
+
+    def _add(self, entity: str) -> None:
+        if entity in self._entities:
+            self._entities.move_to_end(entity)
+        else:
+            self._entities[entity] = None
+            if len(self._entities) > self.max_entities:
+                self._entities.popitem(last=False)
+        self._summary = None
+        self.version += 1
+
+    def extract(self, content: str) -> None:
+        content_upper = content.upper()
+        content_lower = content.lower()
+
+        for flight in FLIGHT_PATTERN.findall(content_upper):
+            self._add(f"Voo: {flight}")
+
+        for seat in SEAT_PATTERN.findall(content_upper):
+            self._add(f"Assento: {seat}")
+
+        if CANCEL_PATTERN.search(content_lower):
+            self._add("Solicitação: Cancelamento")
+
+        if "assento" in content_lower and CHANGE_PATTERN.search(content_lower):
+            self._add("Solicitação: Troca de assento")
+
+    def add_message(self, message) -> None:
+        if message.content:
+            self.extract(str(message.content))
+
+    def clear(self) -> None:
+        self._entities.clear()
+        self._summary = ""
+        self.version += 1
+
+    def entities(self) -> List[str]:
+        return list(self._entities)
+
+    def summary(self) -> str:
+        """Lista formatada ("- Voo: JJ1234"), reconstruída só quando há entidades novas"""
+        if self._summary is None:
+            self._summary = "\n".join(f"- {entity}" for entity in self._entities)
+        return self._summary
+
+    def __len__(self) -> int:
+        return len(self._entities)
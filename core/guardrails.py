@@ -1,11 +1,21 @@
+import asyncio
 import json
+import hashlib
 from pathlib import Path
-from typing import List, Dict
-from openai import OpenAI
+from typing import List, Dict, Optional
+from openai import AsyncOpenAI
 import logging
 
+from .http_client import OpenAIClientFactory
+from .semantic_prefilter import SemanticPrefilter
+from .keyword_matcher import KeywordMatcher, normalizar_texto
+from .cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
+SEMANTIC_MODE_BATCH = "batch"
+SEMANTIC_MODE_PER_RULE = "per_rule"
+
 
 class GuardrailResult:
     def __init__(self, blocked: bool, reason: str = "", guardrail_name: str = ""):
@@ -16,10 +26,77 @@ class GuardrailResult:
     def __repr__(self):
         return f"<GuardrailResult blocked={self.blocked} reason='{self.reason}'>"
 
+
+def rule_fingerprint(rule: Dict) -> str:
+    """Hash da política semântica; muda quando nome ou descrição são editados"""
+    raw = f"{rule.get('name', '')}\x00{rule.get('description', '')}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def normalizar_mensagem(texto: str) -> str:
+    return " ".join(normalizar_texto(texto).split())
+
+
+class GuardrailRuleSet:
+    """
+    Conjunto de regras pré-processado e imutável.
+    Edições criam um novo conjunto que substitui o anterior de forma atômica,
+    então mensagens em andamento terminam com o conjunto em que começaram.
+    """
+
+    def __init__(self, rules: List[Dict], version: int = 1):
+        self.rules = list(rules)
+        self.version = version
+        self.active_rules = [rule for rule in self.rules if rule.get("enabled", True)]
+        self.keyword_rules = [rule for rule in self.active_rules if rule.get("keywords", [])]
+        self.semantic_rules = [rule for rule in self.active_rules if rule.get("description", "")]
+        self.fingerprints = {id(rule): rule_fingerprint(rule) for rule in self.semantic_rules}
+
+        # Todas as palavras-chave de todas as regras em um único autômato;
+        # o payload (índice da regra, índice da palavra) preserva a prioridade original
+        self.keyword_matcher = KeywordMatcher(
+            (keyword, (rule_index, keyword_index))
+            for rule_index, rule in enumerate(self.keyword_rules)
+            for keyword_index, keyword in enumerate(rule.get("keywords", []))
+        )
+
+    def match_keywords(self, texto: str) -> GuardrailResult:
+        match = self.keyword_matcher.find_best(texto)
+        if match is None:
+            return GuardrailResult(blocked=False)
+
+        palavra, (rule_index, _) = match
+        rule = self.keyword_rules[rule_index]
+        logger.warning(f"[GUARDRAIL] BLOQUEADO por palavra-chave: '{palavra}' na frase: {texto}")
+        return GuardrailResult(
+            blocked=True,
+            reason=f"Contém palavra proibida: '{palavra}'",
+            guardrail_name=rule["name"]
+        )
+
+    def __repr__(self):
+        return f"<GuardrailRuleSet version={self.version} active={len(self.active_rules)}>"
+
+
 class GuardrailsManager:
-    def __init__(self, config_path="config/guardrails_config.json", api_key=None):
-        self.guardrails_config = self._load_config(config_path)
-        self.client = OpenAI(api_key=api_key) if api_key else None
+    def __init__(self, config_path="config/guardrails_config.json", api_key=None,
+                 client_factory: Optional[OpenAIClientFactory] = None,
+                 cache_size: int = 10000, cache_ttl: float = 3600.0,
+                 semantic_mode: str = SEMANTIC_MODE_BATCH,
+                 prefilter: Optional[SemanticPrefilter] = None):
+        self.config_path = config_path
+        # "batch": uma única chamada julga todas as políticas; "per_rule": uma chamada por regra
+        self.semantic_mode = semantic_mode
+        self.rule_set = GuardrailRuleSet(self._load_config(config_path))
+        # Veredictos semânticos por (mensagem normalizada, hash da regra)
+        self.semantic_cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.prefilter = None
+        if prefilter:
+            self.enable_prefilter(prefilter)
+        if client_factory and api_key:
+            self.async_client = client_factory.get_async_client()
+        else:
+            self.async_client = AsyncOpenAI(api_key=api_key) if api_key else None
 
     def _load_config(self, path: str) -> List[Dict]:
         try:
@@ -33,51 +110,56 @@ class GuardrailsManager:
             logger.error(f"[GUARDRAIL] Erro ao carregar guardrails: {e}")
             return []
 
-    def analisar_mensagem(self, texto: str) -> GuardrailResult:
-        logger.debug(f"[GUARDRAIL] Analisando mensagem: {texto[:50]}...")
-        
-        for rule in self.guardrails_config:
-            if not rule.get("enabled", True):
-                continue
+    @property
+    def guardrails_config(self) -> List[Dict]:
+        return self.rule_set.rules
 
-            rule_name = rule.get("name", "Unknown")
-            logger.debug(f"[GUARDRAIL] Verificando regra: {rule_name}")
+    def reload(self, rules: Optional[List[Dict]] = None) -> GuardrailRuleSet:
+        """Recompila as regras (do arquivo ou da lista informada) e troca o conjunto ativo"""
+        if rules is None:
+            rules = self._load_config(self.config_path)
+        rule_set = GuardrailRuleSet(rules, version=self.rule_set.version + 1)
+        self.rule_set = rule_set
+        if self.prefilter:
+            self.prefilter.index(rule_set.semantic_rules)
 
-            keywords = rule.get("keywords", [])
-            if keywords:
-                result = self._check_keyword_guardrail(texto, rule)
-                if result.blocked:
-                    return result
+        valid = set(rule_set.fingerprints.values())
+        removed = self.semantic_cache.invalidate(lambda key: key[1] not in valid)
+        if removed:
+            logger.info(f"[GUARDRAIL] {removed} veredictos removidos do cache após edição de regras")
+        logger.info(f"[GUARDRAIL] Regras recarregadas (versão {rule_set.version}, {len(rule_set.active_rules)} ativas)")
+        return rule_set
 
-            if self.client and rule.get("description", ""):
-                result = self._check_semantic_guardrail(texto, rule)
-                if result.blocked:
-                    return result
+    def enable_prefilter(self, prefilter: SemanticPrefilter) -> None:
+        """Ativa o pré-filtro por embeddings antes do juiz LLM"""
+        prefilter.index(self.rule_set.semantic_rules)
+        self.prefilter = prefilter
 
-        logger.debug(f"[GUARDRAIL] Nenhuma violação detectada para: {texto[:50]}...")
+    async def semantic_candidates(self, texto: str, rules: List[Dict]) -> List[Dict]:
+        """Regras semânticas que precisam do LLM (todas, se não houver pré-filtro)"""
+        if not self.prefilter or not rules:
+            return rules
+        return await self.prefilter.filter(texto, rules)
+
+    async def check_semantic_prefiltered(self, texto: str) -> GuardrailResult:
+        """Pré-filtro por embeddings seguido do juiz LLM só para as regras candidatas"""
+        rules = await self.semantic_candidates(texto, self.rule_set.semantic_rules)
+        if self.use_batch(rules):
+            return await self.check_semantic_batch_async(texto, rules)
+        for result in await asyncio.gather(*(self.check_semantic_async(texto, rule) for rule in rules)):
+            if result.blocked:
+                return result
         return GuardrailResult(blocked=False)
 
+    def get_active_rules(self) -> List[Dict]:
+        return self.rule_set.active_rules
 
-    def _check_keyword_guardrail(self, texto: str, rule: Dict) -> GuardrailResult:
-        keywords = rule.get("keywords", [])
-        
-        for palavra in keywords:
-            if palavra.lower() in texto.lower():
-                logger.warning(f"[GUARDRAIL] BLOQUEADO por palavra-chave: '{palavra}' na frase: {texto}")
-                return GuardrailResult(
-                    blocked=True,
-                    reason=f"Contém palavra proibida: '{palavra}'",
-                    guardrail_name=rule["name"]
-                )
-        
-        return GuardrailResult(blocked=False)
+    def check_keywords(self, texto: str) -> GuardrailResult:
+        """Executa apenas as regras de palavra-chave (sem chamadas de rede)"""
+        return self.rule_set.match_keywords(texto)
 
-    def _check_semantic_guardrail(self, texto: str, rule: Dict) -> GuardrailResult:
-        try:
-            description = rule.get("description", "")
-            name = rule.get("name", "SemanticGuardrail")
-            
-            prompt = f"""Analise se a seguinte mensagem viola a política: "{description}"
+    def _build_semantic_messages(self, texto: str, description: str) -> List[Dict]:
+        prompt = f"""Analise se a seguinte mensagem viola a política: "{description}"
 
 Mensagem: "{texto}"
 
@@ -87,30 +169,174 @@ Responda apenas com:
 
 Seguido de uma breve explicação em uma linha."""
 
-            response = self.client.chat.completions.create(
+        return [
+            {"role": "system", "content": "Você é um sistema de moderação que analisa se mensagens violam políticas específicas."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _parse_semantic_response(self, result_text: str, name: str) -> GuardrailResult:
+        if result_text.startswith("BLOCK"):
+            explanation = result_text.replace("BLOCK", "").strip()
+            logger.warning(f"[GUARDRAIL] BLOQUEADO por {name}: {explanation}")
+            return GuardrailResult(
+                blocked=True,
+                reason=explanation or "Violação detectada por análise semântica",
+                guardrail_name=name
+            )
+        
+        logger.debug(f"[GUARDRAIL] Aprovado por {name}")
+        return GuardrailResult(blocked=False)
+
+    def cache_stats(self) -> Dict:
+        return self.semantic_cache.stats()
+
+    def _cache_key(self, texto: str, rule: Dict) -> tuple:
+        fingerprint = self.rule_set.fingerprints.get(id(rule)) or rule_fingerprint(rule)
+        return (normalizar_mensagem(texto), fingerprint)
+
+    async def check_semantic_async(self, texto: str, rule: Dict) -> GuardrailResult:
+        """Guardrail semântico de uma regra (modo por regra), usado no pre-flight concorrente"""
+        if not self.async_client or not rule.get("description", ""):
+            return GuardrailResult(blocked=False)
+
+        cache_key = self._cache_key(texto, rule)
+        cached = self.semantic_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            description = rule.get("description", "")
+            name = rule.get("name", "SemanticGuardrail")
+
+            response = await self.async_client.chat.completions.create(
                 model="gpt-4.1-mini",
-                messages=[
-                    {"role": "system", "content": "Você é um sistema de moderação que analisa se mensagens violam políticas específicas."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_semantic_messages(texto, description),
                 max_tokens=100,
                 temperature=0.1
             )
-            
+
             result_text = response.choices[0].message.content.strip()
-            
-            if result_text.startswith("BLOCK"):
-                explanation = result_text.replace("BLOCK", "").strip()
-                logger.warning(f"[GUARDRAIL] BLOQUEADO por {name}: {explanation}")
-                return GuardrailResult(
+            result = self._parse_semantic_response(result_text, name)
+            self.semantic_cache.set(cache_key, result)
+            return result
+
+        except Exception as e:
+            logger.error(f"[GUARDRAIL] Erro ao executar guardrail semântico ({rule.get('name', 'Unknown')}): {e}")
+            return GuardrailResult(blocked=False)
+
+    def use_batch(self, rules: List[Dict]) -> bool:
+        return self.semantic_mode == SEMANTIC_MODE_BATCH and len(rules) > 1
+
+    def _build_batch_request(self, texto: str, rules: List[Dict]) -> Dict:
+        policies = "\n".join(
+            f"{index}. {rule.get('description', '')}" for index, rule in enumerate(rules, 1)
+        )
+        prompt = f"""Analise se a seguinte mensagem viola cada uma das políticas abaixo.
+
+Políticas:
+{policies}
+
+Mensagem: "{texto}"
+
+Para cada política retorne "BLOCK" se a mensagem a viola (mesmo que indiretamente)
+ou "ALLOW" caso contrário, com uma breve explicação em uma linha."""
+
+        schema = {
+            "type": "object",
+            "properties": {
+                "verdicts": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "policy": {"type": "string", "enum": [str(i) for i in range(1, len(rules) + 1)]},
+                            "verdict": {"type": "string", "enum": ["BLOCK", "ALLOW"]},
+                            "reason": {"type": "string"}
+                        },
+                        "required": ["policy", "verdict", "reason"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["verdicts"],
+            "additionalProperties": False
+        }
+
+        return {
+            "model": "gpt-4.1-mini",
+            "messages": [
+                {"role": "system", "content": "Você é um sistema de moderação que analisa se mensagens violam políticas específicas."},
+                {"role": "user", "content": prompt}
+            ],
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "guardrail_verdicts", "strict": True, "schema": schema}
+            },
+            "max_tokens": 50 + 60 * len(rules),
+            "temperature": 0.1
+        }
+
+    def _parse_batch_response(self, content: str, rules: List[Dict]) -> List[GuardrailResult]:
+        """Converte a resposta estruturada em um resultado por regra (na ordem das regras)"""
+        verdicts = {item["policy"]: item for item in json.loads(content)["verdicts"]}
+
+        results = []
+        for index, rule in enumerate(rules, 1):
+            item = verdicts.get(str(index))
+            if item is None:
+                raise ValueError(f"Veredicto ausente para a política {index}")
+            name = rule.get("name", "SemanticGuardrail")
+            if item["verdict"] == "BLOCK":
+                results.append(GuardrailResult(
                     blocked=True,
-                    reason=explanation or "Violação detectada por análise semântica",
+                    reason=item.get("reason") or "Violação detectada por análise semântica",
                     guardrail_name=name
-                )
-            
-            logger.debug(f"[GUARDRAIL] Aprovado por {name}")
+                ))
+            else:
+                results.append(GuardrailResult(blocked=False))
+        return results
+
+    def _split_cached(self, texto: str, rules: List[Dict]):
+        """Separa as regras com veredicto em cache das que precisam ir ao LLM"""
+        cached: Dict[int, GuardrailResult] = {}
+        pending: List[int] = []
+        for index, rule in enumerate(rules):
+            result = self.semantic_cache.get(self._cache_key(texto, rule))
+            if result is None:
+                pending.append(index)
+            else:
+                cached[index] = result
+        return cached, pending
+
+    def _merge_batch(self, texto: str, rules: List[Dict], cached: Dict[int, GuardrailResult],
+                     pending: List[int], fresh: List[GuardrailResult]) -> GuardrailResult:
+        for index, result in zip(pending, fresh):
+            self.semantic_cache.set(self._cache_key(texto, rules[index]), result)
+            cached[index] = result
+
+        for index in range(len(rules)):
+            result = cached.get(index)
+            if result is not None and result.blocked:
+                logger.warning(f"[GUARDRAIL] BLOQUEADO por {result.guardrail_name}: {result.reason}")
+                return result
+        return GuardrailResult(blocked=False)
+
+    async def check_semantic_batch_async(self, texto: str, rules: List[Dict]) -> GuardrailResult:
+        if not self.async_client:
             return GuardrailResult(blocked=False)
-            
+
+        cached, pending = self._split_cached(texto, rules)
+        if not pending:
+            return self._merge_batch(texto, rules, cached, [], [])
+
+        pending_rules = [rules[index] for index in pending]
+        try:
+            response = await self.async_client.chat.completions.create(
+                **self._build_batch_request(texto, pending_rules)
+            )
+            fresh = self._parse_batch_response(response.choices[0].message.content, pending_rules)
         except Exception as e:
-            logger.error(f"[GUARDRAIL] Erro ao executar guardrail semântico ({rule.get('name', 'Unknown')}): {e}")
-            return GuardrailResult(blocked=False)
+            logger.warning(f"[GUARDRAIL] Falha no modo em lote, usando verificação por regra: {e}")
+            fresh = await asyncio.gather(*(self.check_semantic_async(texto, rule) for rule in pending_rules))
+
+        return self._merge_batch(texto, rules, cached, pending, list(fresh))
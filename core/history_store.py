@@ -0,0 +1,302 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLEAR_OP = "clear"
+SNAPSHOT_OP = "snapshot"
+_MARKER_PREFIX = b'{"__op__"'
+
+
+def _fsync_dir(path: Path) -> None:
+    """Torna o rename durável (nem todo sistema permite abrir diretórios)"""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class JsonlHistoryStore:
+    """
+    Persistência append-only do histórico em JSON Lines.
+    Cada mensagem nova custa uma linha (O(1)); fsync é feito em lote e o log
+    é compactado quando acumula registros mortos (ex.: após limpezas).
+
+    Cada compactação gera um snapshot: cabeçalho com número de geração e
+    checksum, escrito em arquivo temporário, fsync e rename atômico. A geração
+    anterior fica em `<arquivo>.prev`; se o snapshot atual não passa no
+    checksum, a recuperação volta para ela.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        legacy_path: Optional[str] = None,
+        fsync_every: int = 20,
+        fsync_interval: float = 1.0,
+        compact_threshold: int = 500
+    ):
+        self.path = Path(path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self.previous_path = self.path.with_suffix(self.path.suffix + ".prev")
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_threshold = compact_threshold
+
+        self._handle = None
+        self._reader = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._dead_records = 0
+        # Geração do último snapshot (0 = log nunca compactado)
+        self.generation = 0
+        # Id da primeira mensagem viva: os ids seguem crescendo depois de um clear
+        self._first_id = 0
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Lê o log e retorna os registros vivos (após o último clear)"""
+        return self._read_many(self.scan())
+
+    def scan(self) -> List[int]:
+        """
+        Offsets das linhas vivas (após o último clear), sem decodificar o JSON:
+        os registros são lidos depois, sob demanda, com read_at.
+        """
+        if not self.path.exists() and self.legacy_path and self.legacy_path.exists():
+            self._migrate_legacy()
+
+        result = self._recover()
+        if result is None:
+            return []
+
+        offsets, dead, self.generation, self._first_id = result
+        self._dead_records = dead
+        if dead >= self.compact_threshold:
+            # Raro: a compactação precisa dos registros decodificados
+            self.compact(self._read_many(offsets))
+            return self.scan()
+        return offsets
+
+    def first_id(self) -> int:
+        """Id da primeira mensagem viva (válido depois do scan)"""
+        return self._first_id
+
+    def _recover(self) -> Optional[tuple]:
+        """Usa a geração mais nova íntegra: o log atual ou, se ele falhar no checksum, o .prev"""
+        current = self._scan_file(self.path) if self.path.exists() else None
+        if current is not None:
+            offsets, dead, generation, first_id, valid = current
+            if valid:
+                return offsets, dead, generation, first_id
+            logger.warning(f"[HISTORY] Snapshot geração {generation} de {self.path} corrompido")
+
+        if self.previous_path.exists():
+            offsets, dead, generation, first_id, valid = self._scan_file(self.previous_path)
+            if valid:
+                os.replace(self.previous_path, self.path)
+                _fsync_dir(self.path.parent)
+                logger.warning(f"[HISTORY] Recuperada a geração {generation} de {self.path}")
+                return offsets, dead, generation, first_id
+
+        if current is not None:
+            # Nenhuma geração íntegra: aproveita o que for legível do log atual
+            return current[:4]
+        return None
+
+    def _scan_file(self, path: Path) -> tuple:
+        """(offsets vivos, registros mortos, geração, id da primeira mensagem, snapshot íntegro)"""
+        offsets: List[int] = []
+        dead = 0
+        first_id = 0
+        position = 0
+        header: Optional[Dict[str, Any]] = None
+        digest = hashlib.sha256()
+        remaining = 0
+        with open(path, "rb") as f:
+            for number, raw in enumerate(f):
+                offset = position
+                position += len(raw)
+                if remaining:
+                    digest.update(raw)
+                    remaining -= 1
+                line = raw.rstrip()
+                if not line:
+                    continue
+                if not line.endswith(b"}"):
+                    # Linha parcial de uma escrita interrompida
+                    dead += 1
+                    continue
+                if line.startswith(_MARKER_PREFIX):
+                    try:
+                        marker = json.loads(line)
+                    except json.JSONDecodeError:
+                        dead += 1
+                        continue
+                    if marker.get("__op__") == CLEAR_OP:
+                        dead += len(offsets) + 1
+                        offsets = []
+                        first_id = marker.get("first_id", 0)
+                        continue
+                    if marker.get("__op__") == SNAPSHOT_OP and number == 0:
+                        header = marker
+                        first_id = marker.get("first_id", 0)
+                        remaining = marker.get("records", 0)
+                        continue
+                offsets.append(offset)
+
+        if header is None:
+            return offsets, dead, 0, first_id, True
+        valid = remaining == 0 and digest.hexdigest() == header.get("checksum")
+        return offsets, dead, header.get("generation", 0), first_id, valid
+
+    def read_at(self, offset: int) -> Dict[str, Any]:
+        """Decodifica o registro que começa em `offset` (obtido com scan)"""
+        if self._reader is None:
+            self._reader = open(self.path, "rb")
+        self._reader.seek(offset)
+        return json.loads(self._reader.readline())
+
+    def read_each(self, offsets: List[int]) -> List[Optional[Dict[str, Any]]]:
+        """Registros dos offsets dados, na ordem (None para linhas ilegíveis)"""
+        records: List[Optional[Dict[str, Any]]] = []
+        for offset in offsets:
+            try:
+                records.append(self.read_at(offset))
+            except ValueError:
+                records.append(None)
+        return records
+
+    def _read_many(self, offsets: List[int]) -> List[Dict[str, Any]]:
+        records = []
+        for offset in offsets:
+            try:
+                records.append(self.read_at(offset))
+            except json.JSONDecodeError:
+                continue
+        self.release_reader()
+        return records
+
+    def release_reader(self) -> None:
+        if self._reader:
+            self._reader.close()
+            self._reader = None
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        handle = self._get_handle()
+        handle.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+        handle.flush()
+        self._unsynced += len(records)
+        self._maybe_fsync()
+
+    def clear(self, live_count: int, first_id: int = 0) -> None:
+        """
+        Registra uma limpeza no log (com o id da próxima mensagem); compacta se
+        houver muitos registros mortos
+        """
+        self._dead_records += live_count + 1
+        self._first_id = first_id
+        # O marcador vai antes da compactação para que a geração anterior também registre a limpeza
+        self.append([{"__op__": CLEAR_OP, "first_id": first_id}])
+        if self._dead_records >= self.compact_threshold:
+            self.compact([])
+
+    def compact(self, records: List[Dict[str, Any]]) -> None:
+        """Grava um snapshot com os registros vivos (temp + fsync + rename atômico)"""
+        self.close()
+        generation = self.generation + 1
+        body = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+        header = {
+            "__op__": SNAPSHOT_OP,
+            "generation": generation,
+            "records": len(records),
+            "first_id": self._first_id,
+            "checksum": hashlib.sha256(body).hexdigest()
+        }
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write((json.dumps(header) + "\n").encode("utf-8"))
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if self.path.exists():
+            self._keep_previous()
+        os.replace(tmp_path, self.path)
+        _fsync_dir(self.path.parent)
+        self.generation = generation
+        self._dead_records = 0
+        logger.info(f"[HISTORY] Snapshot geração {generation}: {len(records)} registros em {self.path}")
+
+    def _keep_previous(self) -> None:
+        """Preserva a geração atual em .prev (hard link; cópia se o sistema não suportar)"""
+        tmp_previous = self.previous_path.with_suffix(self.previous_path.suffix + ".tmp")
+        if tmp_previous.exists():
+            tmp_previous.unlink()
+        try:
+            os.link(self.path, tmp_previous)
+        except OSError:
+            shutil.copyfile(self.path, tmp_previous)
+        os.replace(tmp_previous, self.previous_path)
+
+    def flush(self) -> None:
+        if self._handle and self._unsynced:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        if self._handle:
+            self.flush()
+            self._handle.close()
+            self._handle = None
+        self.release_reader()
+
+    def _get_handle(self):
+        if self._handle is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            needs_newline = False
+            if self.path.exists() and self.path.stat().st_size > 0:
+                with open(self.path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b"\n"
+            self._handle = open(self.path, "a", encoding="utf-8")
+            if needs_newline:
+                # Isola uma linha parcial deixada por uma escrita interrompida
+                self._handle.write("\n")
+        return self._handle
+
+    def _maybe_fsync(self) -> None:
+        if (self._unsynced >= self.fsync_every or
+                time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.flush()
+
+    def _migrate_legacy(self) -> None:
+        """Converte o formato antigo (array JSON) para JSON Lines"""
+        if self.legacy_path.stat().st_size == 0:
+            return
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if not isinstance(data, list):
+                return
+            self.compact(data)
+            logger.info(f"[HISTORY] Migrados {len(data)} registros de {self.legacy_path} para {self.path}")
+        except Exception as e:
+            logger.warning(f"[HISTORY] Erro ao migrar histórico legado {self.legacy_path}: {e}")
@@ -0,0 +1,54 @@
+import importlib.util
+from typing import Optional
+import logging
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIClientFactory:
+    """
+    Fábrica do cliente OpenAI assíncrono com um único pool HTTP (keep-alive) por processo.
+    Agentes, guardrails e moderação recebem o mesmo cliente, evitando novos
+    handshakes TCP/TLS a cada componente.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+        http2: bool = True
+    ):
+        self.api_key = api_key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = timeout
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            logger.warning("[HTTP] Pacote 'h2' não instalado - usando HTTP/1.1")
+
+        self._async_client: Optional[AsyncOpenAI] = None
+
+    def get_async_client(self) -> AsyncOpenAI:
+        if self._async_client is None:
+            http_client = DefaultAsyncHttpxClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2
+            )
+            self._async_client = AsyncOpenAI(api_key=self.api_key, http_client=http_client)
+            logger.info(f"[HTTP] Pool assíncrono criado (max={self.limits.max_connections}, http2={self.http2})")
+        return self._async_client
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
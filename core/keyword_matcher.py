@@ -0,0 +1,105 @@
+import unicodedata
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def normalizar_texto(texto: str) -> str:
+    """Remove acentos e normaliza caixa ("Férias" -> "ferias")"""
+    decomposed = unicodedata.normalize("NFKD", texto)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+class KeywordMatcher:
+    """
+    Autômato Aho-Corasick sobre palavras-chave normalizadas.
+    Depois de compilado, encontra todas as ocorrências com uma única passada
+    linear pela mensagem, independente de quantas palavras-chave existam.
+    """
+
+    def __init__(self, keywords: Optional[Iterable[Tuple[str, Any]]] = None):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        # Palavras que terminam em cada estado (sem as herdadas pelos links de falha)
+        self._terminal: List[List[int]] = [[]]
+        self._keywords: List[Tuple[str, Any]] = []
+        self._compiled = False
+
+        for keyword, payload in keywords or []:
+            self.add(keyword, payload)
+        self.compile()
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def add(self, keyword: str, payload: Any = None) -> None:
+        normalized = normalizar_texto(keyword)
+        if not normalized:
+            return
+
+        state = 0
+        for ch in normalized:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._terminal.append([])
+            state = next_state
+
+        self._terminal[state].append(len(self._keywords))
+        self._keywords.append((keyword, payload))
+        self._compiled = False
+
+    def compile(self) -> None:
+        """Calcula os links de falha (BFS) e propaga as saídas (pode ser chamado de novo após add)"""
+        self._output = [list(terminal) for terminal in self._terminal]
+        queue = deque()
+        for next_state in self._goto[0].values():
+            self._fail[next_state] = 0
+            queue.append(next_state)
+
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+        self._compiled = True
+
+    def iter_matches(self, texto: str):
+        """Gera (keyword, payload) para cada ocorrência encontrada na mensagem"""
+        if not self._compiled:
+            self.compile()
+        if not self._keywords:
+            return
+
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for ch in normalizar_texto(texto):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in output[state]:
+                yield self._keywords[index]
+
+    def find_all(self, texto: str) -> List[Tuple[str, Any]]:
+        return list(self.iter_matches(texto))
+
+    def find_best(self, texto: str) -> Optional[Tuple[str, Any]]:
+        """Retorna a ocorrência com menor payload (prioridade), ou None"""
+        best = None
+        for match in self.iter_matches(texto):
+            if best is None or match[1] < best[1]:
+                best = match
+        return best
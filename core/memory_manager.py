@@ -1,8 +1,28 @@
 from semantic_kernel.contents import ChatHistory, ChatMessageContent
 from semantic_kernel.contents.utils.author_role import AuthorRole
-from typing import List
-import json
+from typing import List, Dict, Optional, Callable, Iterable, Tuple, Union
+from functools import partial
+from collections import OrderedDict, defaultdict, deque
 from pathlib import Path
+import asyncio
+import logging
+import re
+import threading
+import time
+
+from .history_store import JsonlHistoryStore
+from .message_record import LazyMessageList, MessageRecord
+from .entities import EntityStore
+from .context_window import ContextWindow
+from .persistence import PersistenceWorker
+from .sqlite_store import ConversationDatabase, SQLiteHistoryStore, SQLiteSummaryStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_ID = "default"
+# Também validado na API (api/config.py importa daqui)
+SESSION_ID_REGEX = r"^[A-Za-z0-9_-]{1,64}$"
+SESSION_ID_PATTERN = re.compile(SESSION_ID_REGEX)
 
 
 def criar_memoria_volatil():
@@ -13,72 +33,285 @@ def criar_memoria_volatil():
     return ChatHistory()
 
 
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
 class ChatHistoryManager:
     """
     Gerenciador de histórico de conversas com persistência.
-    Mantém histórico em memória e permite salvar/carregar de arquivo.
+    Mantém histórico em memória (como MessageRecord compactos) e permite
+    salvar/carregar de arquivo.
     """
     
-    def __init__(self, persist_file: str = "chat_history.json"):
-        self.chat_history = ChatHistory()
+    def __init__(self, persist_file: str = "chat_history.jsonl", persistence: Optional[PersistenceWorker] = None,
+                 store=None, summary_store=None):
+        self.messages = LazyMessageList()
+        # Com um worker, save_history só agenda a escrita; sem ele, grava na hora
+        self.persistence = persistence
+        self._io_lock = threading.Lock()
         self.persist_file = Path(persist_file)
+        # Backend de armazenamento: JSONL por padrão ou outro com a mesma interface (ex.: SQLite)
+        self.store = store or JsonlHistoryStore(
+            str(self.persist_file),
+            legacy_path=str(self.persist_file.with_suffix(".json"))
+        )
+        self._persisted_count = 0
+        self.entities = EntityStore()
+        self.context_window = ContextWindow(self.entities)
+        # Resumos hierárquicos das mensagens antigas, guardados ao lado do log
+        self.summary_store = summary_store or JsonlHistoryStore(str(self.persist_file.with_suffix(".summary.jsonl")))
+        self.summaries: List[Dict] = []
+        # Escritas adiadas para a próxima gravação (no worker, se houver):
+        # limpeza do log (quantos registros estavam persistidos) e resumos novos
+        self._pending_clear: Optional[int] = None
+        self._summaries_dirty = False
+        # Incrementado a cada limpeza (descarta resumos gerados antes dela)
+        self.generation = 0
+        # Índices de posições por agente (últimas N) e por papel, atualizados no add_message
+        self.agent_index_size = 64
+        self._agent_index: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.agent_index_size))
+        self._role_index: Dict[str, List[int]] = defaultdict(list)
+        # Primeira posição coberta pelos índices/janela (antes dela, só no disco)
+        self._indexed_from = 0
+        # Id da mensagem na posição 0: id = first_id + posição. Um clear avança
+        # first_id em vez de recomeçar do zero, então os ids nunca se repetem
+        self.first_id = 0
         self._load_history_if_exists()
     
-    def add_message(self, message: ChatMessageContent):
-        self.chat_history.add_message(message)
+    def add_message(self, message: Union[ChatMessageContent, MessageRecord]):
+        if not isinstance(message, MessageRecord):
+            message = MessageRecord.from_chat_message(message)
+        self.messages.append(message)
+        self._index_message(len(self.messages) - 1, message)
+        self.entities.add_message(message)
+        self.context_window.add_message(message)
+    
+    def _index_message(self, position: int, message: MessageRecord):
+        if message.name:
+            self._agent_index[message.name].append(position)
+        self._role_index[message.role.value].append(position)
     
-    def get_history(self) -> List[ChatMessageContent]:
-        return list(self.chat_history.messages)
+    def _rebuild_indexes(self):
+        self._agent_index.clear()
+        self._role_index.clear()
+        self._indexed_from = 0
+        for position, message in enumerate(self.messages):
+            self._index_message(position, message)
+    
+    def get_history(self) -> List[MessageRecord]:
+        return list(self.messages)
+    
+    @staticmethod
+    def _to_chat_history(messages: Iterable[MessageRecord]) -> ChatHistory:
+        """Converte para ChatHistory do Semantic Kernel (ignora mensagens sem texto, ex.: chamadas de função)"""
+        chat_history = ChatHistory()
+        for message in messages:
+            if message.content:
+                chat_history.add_message(message.to_chat_message())
+        return chat_history
     
     def get_chat_history(self) -> ChatHistory:
-        return self.chat_history
+        return self._to_chat_history(self.messages)
     
     def clear_history(self):
-        self.chat_history.clear()
+        self._agent_index.clear()
+        self._role_index.clear()
+        self._indexed_from = 0
+        self.entities.clear()
+        self.context_window.clear()
+        self.generation += 1
+        self._summaries_dirty = self._summaries_dirty or bool(self.summaries)
+        self.summaries = []
+        with self._io_lock:
+            self.first_id += len(self.messages)
+            self.messages.clear()
+            if self._pending_clear is None:
+                self._pending_clear = self._persisted_count
+            self._persisted_count = 0
+        self.save_history()
     
     def _load_history_if_exists(self):
-        if self.persist_file.exists() and self.persist_file.stat().st_size > 0:
-            try:
-                with open(self.persist_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    for msg_data in data:
-                        try:
-                            message = ChatMessageContent.model_validate(msg_data)
-                            self.chat_history.add_message(message)
-                        except Exception:
-                            continue
-            except Exception as e:
-                print(f"Erro ao carregar histórico: {e}")
+        """
+        Carregamento preguiçoso: só os offsets do log (ou a contagem, em
+        backends com leitura por faixa) são lidos; apenas a cauda que cabe na
+        janela de contexto é decodificada agora, em uma leitura (índices,
+        entidades e janela partem dela). O restante é decodificado sob demanda.
+        """
+        try:
+            if hasattr(self.store, "read_range"):
+                total = self.store.count()
+                self.messages = LazyMessageList(self.store.read_range, total)
+            else:
+                offsets = self.store.scan()
+                total = len(offsets)
+                self.messages = LazyMessageList(lambda start, end: self.store.read_each(offsets[start:end]), total)
+            self.first_id = self.store.first_id()
+            self._indexed_from = max(total - self.context_window.entries.maxlen, 0)
+            self.context_window.start_at(self._indexed_from)
+            self.messages.prefetch(self._indexed_from, total)
+            for position in range(self._indexed_from, total):
+                message = self.messages[position]
+                self._index_message(position, message)
+                self.entities.add_message(message)
+                self.context_window.add_message(message)
+            self.store.release_reader()
+            self._persisted_count = len(self.messages)
+            self._load_summaries()
+        except Exception as e:
+            print(f"Erro ao carregar histórico: {e}")
+    
+    def _load_summaries(self):
+        summaries = self.summary_store.load()
+        if summaries and summaries[-1].get("end", 0) > len(self.messages):
+            logger.warning(f"[SUMMARY] Resumos de {self.persist_file} não correspondem ao log - ignorados")
+            return
+        self.summaries = summaries
+        if summaries:
+            self.context_window.set_summary(self.summary_text(), self.summarized_until)
+    
+    @property
+    def summarized_until(self) -> int:
+        """Índice da primeira mensagem que ainda não foi resumida"""
+        return self.summaries[-1]["end"] if self.summaries else 0
+    
+    def summary_text(self) -> str:
+        return "\n".join(summary["content"] for summary in self.summaries)
+    
+    def set_summaries(self, summaries: List[Dict]):
+        self.summaries = summaries
+        self._summaries_dirty = True
+        self.context_window.set_summary(self.summary_text(), self.summarized_until)
+        self.save_history()
+    
+    def get_messages_range(self, start: int, end: int) -> List[MessageRecord]:
+        return self.messages[start:end]
     
     def save_history(self):
-        self.save_history_sync()
+        if self.persistence:
+            self.persistence.save(self)
+        else:
+            self.save_history_sync()
     
     def save_history_sync(self):
+        with self._io_lock:
+            self._write_pending()
+    
+    def _write_pending(self):
+        """
+        Aplica a limpeza pendente, anexa ao log apenas as mensagens ainda não
+        persistidas e regrava os resumos se mudaram (chamar com _io_lock)
+        """
         try:
-            data = []
-            for message in self.chat_history.messages:
-                try:
-                    data.append(message.model_dump())
-                except Exception:
-                    continue
+            if self._pending_clear is not None:
+                self.store.clear(self._pending_clear, self.first_id)
+                self._pending_clear = None
+            messages = self.messages
+            end = len(messages)
+            if end < self._persisted_count:
+                # Histórico foi alterado fora do clear_history: recomeçar o log
+                self.store.clear(self._persisted_count, self.first_id)
+                self._persisted_count = 0
+                self._rebuild_indexes()
             
-            with open(self.persist_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.store.append([message.to_dict() for message in messages[self._persisted_count:end]])
+            self._persisted_count = end
         except Exception as e:
             print(f"Erro ao salvar histórico: {e}")
+        if self._summaries_dirty:
+            # Desmarca antes de ler self.summaries: um set_summaries concorrente marca de novo
+            self._summaries_dirty = False
+            try:
+                self.summary_store.compact(self.summaries)
+            except Exception as e:
+                print(f"Erro ao salvar resumos: {e}")
+    
+    def flush(self):
+        """Força o fsync das escritas pendentes e fecha o log"""
+        with self._io_lock:
+            try:
+                self.store.close()
+                self.summary_store.close()
+            except Exception as e:
+                print(f"Erro ao sincronizar histórico: {e}")
     
-    def get_recent_messages_by_agent(self, agent_name: str, count: int = 5) -> List[ChatMessageContent]:
-        agent_messages = [msg for msg in self.chat_history.messages 
-                         if hasattr(msg, 'name') and msg.name == agent_name]
-        return agent_messages[-count:] if len(agent_messages) > count else agent_messages
+    def get_recent_messages_by_agent(self, agent_name: str, count: int = 5) -> List[MessageRecord]:
+        """Últimas `count` mensagens do agente via índice (O(count))"""
+        if count <= 0:
+            return []
+        positions = self._agent_index.get(agent_name) or ()
+        messages = self.messages
+        start = max(len(positions) - count, 0)
+        recent = [messages[positions[i]] for i in range(start, len(positions))]
+        
+        missing = count - len(recent)
+        if missing > 0:
+            if len(positions) == self.agent_index_size:
+                # Pedido maior que o buffer: busca as anteriores à mais antiga do índice
+                recent = self._find_older(positions[0], missing, name=agent_name) + recent
+            elif self._indexed_from:
+                # Índice cobre só a cauda carregada: as anteriores ficam no disco
+                # (consulta indexada no SQLite, varredura em blocos no JSONL)
+                recent = self._find_older(self._indexed_from, missing, name=agent_name) + recent
+        return recent
     
-    def get_context_for_agent(self, agent_name: str, max_interactions: int = 5) -> ChatHistory:
-        context_history = ChatHistory()
+    def _find_older(self, end: int, count: Optional[int] = None, role: Optional[str] = None,
+                    name: Optional[str] = None) -> List[MessageRecord]:
+        """
+        Até `count` mensagens anteriores à posição `end` com o papel/agente dado,
+        em ordem cronológica. Usa a consulta indexada do backend quando existe
+        (find); senão varre para trás decodificando em blocos sob demanda.
+        """
+        messages = self.messages
+        found = []
+        
+        def wanted() -> bool:
+            return count is None or len(found) < count
+        
+        def matches(message: MessageRecord) -> bool:
+            return (role is None or message.role.value == role) and (name is None or message.name == name)
+        
+        # Mensagens adicionadas nesta execução (sem offset) já estão em memória
+        position = end - 1
+        while position >= messages.persisted and wanted():
+            if matches(messages[position]):
+                found.append(messages[position])
+            position -= 1
         
+        if position >= 0 and wanted():
+            if hasattr(self.store, "find"):
+                limit = None if count is None else count - len(found)
+                for data in self.store.find(position, limit, role=role, name=name):
+                    found.append(MessageRecord.from_dict(data))
+            else:
+                while position >= 0 and wanted():
+                    block_start = max(position - 63, 0)
+                    messages.prefetch(block_start, position + 1)
+                    while position >= block_start and wanted():
+                        if matches(messages[position]):
+                            found.append(messages[position])
+                        position -= 1
+        
+        found.reverse()
+        return found
+    
+    def get_recent_messages_by_role(self, role: str, count: int = 5) -> List[MessageRecord]:
+        if count <= 0:
+            return []
+        positions = self._role_index.get(role, [])
+        messages = self.messages
+        recent = [messages[position] for position in positions[-count:]]
+        if len(recent) < count and self._indexed_from:
+            recent = self._find_older(self._indexed_from, count - len(recent), role=role) + recent
+        return recent
+    
+    def get_context_for_agent(self, agent_name: str, max_interactions: int = 5) -> ChatHistory:
         agent_messages = self.get_recent_messages_by_agent(agent_name, max_interactions)
         
-        user_messages = [msg for msg in self.chat_history.messages 
-                        if msg.role == AuthorRole.USER][-5:]  # Últimas 5 mensagens de usuários
+        user_messages = self.get_recent_messages_by_role(AuthorRole.USER.value, 5)  # Últimas 5 mensagens de usuários
 
         all_relevant = []
         
@@ -86,60 +319,260 @@ class ChatHistoryManager:
         
         all_relevant.extend(agent_messages)
         
-        all_relevant.sort(key=lambda x: getattr(x, 'timestamp', 0))
-        
-        for msg in all_relevant[-10:]:
-            context_history.add_message(msg)
+        all_relevant.sort(key=lambda x: x.timestamp)
         
-        return context_history
+        return self._to_chat_history(all_relevant[-10:])
 
-    def get_recent_messages(self, count: int = 10) -> List[ChatMessageContent]:
-        messages = list(self.chat_history.messages)
-        return messages[-count:] if len(messages) > count else messages
+    def get_recent_messages(self, count: int = 10) -> List[MessageRecord]:
+        if count <= 0:
+            return []
+        return self.messages[-count:]
     
-    def get_messages_by_role(self, role: str) -> List[ChatMessageContent]:
-        return [msg for msg in self.chat_history.messages if msg.role.value == role]
+    def get_page(self, limit: int, before: Optional[int] = None,
+                 after: Optional[int] = None) -> Tuple[List[Tuple[int, MessageRecord]], bool, int, int]:
+        """
+        Página do histórico por cursor. O id de cada mensagem é first_id + a sua
+        posição e não se repete depois de um clear_history; `after` avança a
+        partir de um id (polling), `before` volta para as mais antigas e, sem
+        cursor, retorna as `limit` mais recentes. Mensagens sem conteúdo (ex.:
+        chamadas de função) são puladas sem contar no limite. Só as mensagens
+        percorridas são decodificadas. Retorna [(id, mensagem)], se há mais
+        mensagens na direção pedida e os cursores next_before/next_after (ids
+        da mais antiga e da mais nova percorridas, puladas inclusive).
+        """
+        messages = self.messages
+        total = len(messages)
+        upper = total if before is None else min(max(before - self.first_id, 0), total)
+        page: List[Tuple[int, MessageRecord]] = []
+        if after is not None:
+            lower = position = min(max(after + 1 - self.first_id, 0), upper)
+            while position < upper and len(page) < limit:
+                end = min(position + limit - len(page), upper)
+                messages.prefetch(position, end)
+                page.extend((p, messages[p]) for p in range(position, end) if messages[p].content)
+                position = end
+            has_more = position < upper
+            upper = position
+        else:
+            position = upper
+            while position > 0 and len(page) < limit:
+                start = max(position - (limit - len(page)), 0)
+                messages.prefetch(start, position)
+                page[:0] = [(p, messages[p]) for p in range(start, position) if messages[p].content]
+                position = start
+            has_more = position > 0
+            lower = position
+        first_id = self.first_id
+        return [(first_id + p, message) for p, message in page], has_more, first_id + lower, first_id + upper - 1
+    
+    def get_messages_by_role(self, role: str) -> List[MessageRecord]:
+        messages = self.messages
+        indexed = [messages[position] for position in self._role_index.get(role, [])]
+        return self._find_older(self._indexed_from, role=role) + indexed if self._indexed_from else indexed
     
     def message_count(self) -> int:
-        return len(self.chat_history.messages)
+        return len(self.messages)
 
 
 class ConversationMemoryManager:
     """
-    Gerenciador avançado de memória de conversas com múltiplas sessões
+    Gerenciador avançado de memória de conversas com múltiplas sessões.
+    Mantém um LRU limitado de sessões ativas; sessões ociosas ou excedentes
+    são persistidas em disco e removidas da memória, exceto as que `in_use`
+    indicar que ainda têm requisição em andamento. Com `database`, as
+    sessões ficam em um banco SQLite em vez de um arquivo JSONL por sessão.
     """
     
-    def __init__(self, base_dir: str = "conversations"):
+    def __init__(
+        self,
+        base_dir: str = "conversations",
+        max_active_sessions: int = 1000,
+        idle_timeout: float = 1800.0,
+        default_file: Optional[str] = None,
+        on_evict: Optional[Callable[[str], None]] = None,
+        persistence: Optional[PersistenceWorker] = None,
+        database: Optional[ConversationDatabase] = None,
+        in_use: Optional[Callable[[str], bool]] = None
+    ):
         self.base_dir = Path(base_dir)
         self.base_dir.mkdir(exist_ok=True)
+        self.max_active_sessions = max_active_sessions
+        self.idle_timeout = idle_timeout
+        self.default_file = default_file
+        self.on_evict = on_evict
+        self.in_use = in_use
+        self.persistence = persistence
+        self.database = database
         self.current_session = None
-        self.sessions = {}
+        self.sessions: "OrderedDict[str, ChatHistoryManager]" = OrderedDict()
+        self._last_access: Dict[str, float] = {}
+        # Sessões descarregadas cuja gravação ainda está na fila (worker ou executor)
+        self._closing: Dict[str, ChatHistoryManager] = {}
+        self._closing_lock = threading.Lock()
+    
+    def _session_file(self, session_id: str) -> Path:
+        if session_id == DEFAULT_SESSION_ID and self.default_file:
+            return Path(self.default_file)
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise ValueError(f"session_id inválido: '{session_id}'")
+        return self.base_dir / f"{session_id}.jsonl"
     
     def create_session(self, session_id: str) -> ChatHistoryManager:
-        session_file = self.base_dir / f"{session_id}.json"
-        manager = ChatHistoryManager(str(session_file))
+        session_file = self._session_file(session_id)  # também valida o session_id
+        # Descarregada e ainda na fila do worker: reaproveita o manager em vez
+        # de abrir um segundo sobre o mesmo arquivo
+        with self._closing_lock:
+            manager = self._closing.pop(session_id, None)
+        if manager is None and self.database:
+            manager = ChatHistoryManager(
+                str(self.database.path),
+                persistence=self.persistence,
+                store=SQLiteHistoryStore(self.database, session_id),
+                summary_store=SQLiteSummaryStore(self.database, session_id)
+            )
+        elif manager is None:
+            manager = ChatHistoryManager(str(session_file), persistence=self.persistence)
         self.sessions[session_id] = manager
+        self._last_access[session_id] = time.monotonic()
         self.current_session = session_id
+        self._evict_overflow()
         return manager
     
     def get_session(self, session_id: str) -> ChatHistoryManager:
+        self.evict_idle()
         if session_id not in self.sessions:
             return self.create_session(session_id)
+        self.sessions.move_to_end(session_id)
+        self._last_access[session_id] = time.monotonic()
         return self.sessions[session_id]
     
+    def evict_session(self, session_id: str) -> None:
+        """Persiste a sessão em disco e a remove da memória"""
+        manager = self.sessions.pop(session_id, None)
+        self._last_access.pop(session_id, None)
+        if manager is None:
+            return
+        loop = _running_loop()
+        if self.persistence or loop:
+            # A gravação (e o fsync) fica com o worker, ou com uma thread do
+            # executor do loop quando não há worker, fora do event loop
+            with self._closing_lock:
+                self._closing[session_id] = manager
+            if self.persistence:
+                self.persistence.save(manager, on_saved=partial(self._close_evicted, session_id, manager))
+            else:
+                loop.run_in_executor(None, self._write_evicted, session_id, manager)
+        else:
+            manager.save_history_sync()
+            manager.flush()
+        if self.current_session == session_id:
+            self.current_session = None
+        if self.on_evict:
+            self.on_evict(session_id)
+        logger.debug(f"[SESSIONS] Sessão {session_id} descarregada para disco")
+    
+    def _write_evicted(self, session_id: str, manager: ChatHistoryManager) -> None:
+        """Grava no executor uma sessão descarregada sem worker"""
+        with manager._io_lock:
+            # Conferido sob o _io_lock: delete_session remove de _closing e só
+            # então espera o lock, então nada é regravado depois de apagado
+            with self._closing_lock:
+                if self._closing.get(session_id) is not manager:
+                    return
+            manager._write_pending()
+        self._close_evicted(session_id, manager)
+    
+    def _close_evicted(self, session_id: str, manager: ChatHistoryManager) -> None:
+        """Chamado na thread do worker depois que a sessão descarregada foi gravada"""
+        with self._closing_lock:
+            if self._closing.get(session_id) is not manager:
+                return  # sessão reaberta ou apagada nesse meio tempo
+            del self._closing[session_id]
+        manager.flush()
+    
+    def _evictable(self, session_id: str) -> bool:
+        return not (self.in_use and self.in_use(session_id))
+    
+    def evict_idle(self) -> int:
+        """Remove sessões sem acesso há mais de idle_timeout segundos"""
+        if not self.idle_timeout:
+            return 0
+        now = time.monotonic()
+        evicted = 0
+        # Ordem do OrderedDict = ordem de acesso, então basta olhar o início
+        for session_id in list(self.sessions):
+            if now - self._last_access.get(session_id, now) < self.idle_timeout:
+                break
+            if self._evictable(session_id):
+                self.evict_session(session_id)
+                evicted += 1
+        return evicted
+    
+    def _evict_overflow(self) -> None:
+        excess = len(self.sessions) - self.max_active_sessions
+        # A mais recente (a que acabou de ser pedida) nunca é descarregada
+        for session_id in list(self.sessions)[:-1]:
+            if excess <= 0:
+                break
+            if self._evictable(session_id):
+                self.evict_session(session_id)
+                excess -= 1
+    
+    def active_sessions(self) -> List[str]:
+        return list(self.sessions.keys())
+    
+    def last_message_time(self) -> Optional[float]:
+        """Horário da mensagem mais recente entre as sessões em memória (não mexe no LRU)"""
+        times = [manager.messages[-1].timestamp for manager in list(self.sessions.values()) if manager.messages]
+        return max(times, default=None) or None
+    
     def list_sessions(self) -> List[str]:
-        return [f.stem for f in self.base_dir.glob("*.json")]
+        if self.database:
+            sessions = set(self.database.list_sessions())
+        else:
+            files = list(self.base_dir.glob("*.jsonl")) + list(self.base_dir.glob("*.json"))
+            # <id>.summary.jsonl e afins não são sessões (o ponto não é válido em session_id)
+            sessions = {f.stem for f in files if SESSION_ID_PATTERN.match(f.stem)}
+        sessions.update(self.sessions.keys())
+        sessions.update(self._closing.keys())
+        return sorted(sessions)
     
     def delete_session(self, session_id: str):
+        with self._closing_lock:
+            closing = self._closing.pop(session_id, None)
+        if closing is not None or session_id in self.sessions:
+            if self.persistence:
+                # Uma escrita pendente recriaria o arquivo depois de apagado
+                self.persistence.flush()
+            (closing or self.sessions[session_id]).flush()
         if session_id in self.sessions:
             del self.sessions[session_id]
+            self._last_access.pop(session_id, None)
+            if self.on_evict:
+                self.on_evict(session_id)
         
-        session_file = self.base_dir / f"{session_id}.json"
-        if session_file.exists():
-            session_file.unlink()
+        session_file = self._session_file(session_id)
+        if self.database:
+            self.database.delete_session(session_id)
+            return
+        summary_file = session_file.with_suffix(".summary.jsonl")
+        for path in (session_file, session_file.with_suffix(".json"), session_file.with_suffix(".jsonl.prev"),
+                     summary_file, summary_file.with_suffix(".jsonl.prev")):
+            if path.exists():
+                path.unlink()
+    
+    def flush_all(self) -> None:
+        if self.persistence:
+            self.persistence.flush()
+        # Sem worker, descarregadas cuja gravação no executor ainda não rodou
+        with self._closing_lock:
+            closing, self._closing = list(self._closing.values()), {}
+        for manager in list(self.sessions.values()) + closing:
+            manager.save_history_sync()
+            manager.flush()
     
     def get_current_session(self) -> ChatHistoryManager:
         if self.current_session and self.current_session in self.sessions:
             return self.sessions[self.current_session]
         
-        return self.create_session("default")
+        return self.get_session(DEFAULT_SESSION_ID)
@@ -0,0 +1,181 @@
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+from semantic_kernel.connectors.ai.completion_usage import CompletionUsage
+from semantic_kernel.contents import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+logger = logging.getLogger(__name__)
+
+_ROLES = {role.value: role for role in AuthorRole}
+
+
+def _usage_tokens(usage) -> Optional[Tuple[int, int]]:
+    """(prompt_tokens, completion_tokens) de um CompletionUsage, dict ou lista"""
+    if usage is None:
+        return None
+    if isinstance(usage, (list, tuple)):
+        return int(usage[0] or 0), int(usage[1] or 0)
+    if isinstance(usage, dict):
+        prompt, completion = usage.get("prompt_tokens"), usage.get("completion_tokens")
+    else:
+        prompt, completion = getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+    if prompt is None and completion is None:
+        return None
+    return int(prompt or 0), int(completion or 0)
+
+
+class MessageRecord:
+    """
+    Registro compacto de uma mensagem do histórico: papel, autor, texto,
+    horário e uso de tokens, sem os itens/metadados aninhados do
+    ChatMessageContent. Só vira ChatMessageContent (to_chat_message) quando
+    é entregue ao Semantic Kernel.
+    """
+
+    __slots__ = ("role", "name", "content", "timestamp", "usage")
+
+    def __init__(self, role: AuthorRole, content: str = "", name: Optional[str] = None,
+                 timestamp: Optional[float] = None, usage: Optional[Tuple[int, int]] = None):
+        self.role = role
+        self.name = name
+        self.content = content
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.usage = usage
+
+    @classmethod
+    def from_chat_message(cls, message: ChatMessageContent) -> "MessageRecord":
+        metadata = message.metadata or {}
+        return cls(
+            role=message.role,
+            content=message.content or "",
+            name=message.name,
+            usage=_usage_tokens(metadata.get("usage"))
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MessageRecord":
+        """Aceita o formato compacto e o dump completo do ChatMessageContent (logs antigos)"""
+        role = _ROLES[data["role"]]
+        if "items" in data:
+            content = next(
+                (item.get("text") or "" for item in data["items"] if item.get("content_type") == "text"),
+                ""
+            )
+            usage = (data.get("metadata") or {}).get("usage")
+        else:
+            content = data.get("content") or ""
+            usage = data.get("usage")
+        return cls(
+            role=role,
+            content=content,
+            name=data.get("name"),
+            timestamp=data.get("timestamp", 0.0),
+            usage=_usage_tokens(usage)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"role": self.role.value, "content": self.content, "timestamp": round(self.timestamp, 3)}
+        if self.name:
+            data["name"] = self.name
+        if self.usage:
+            data["usage"] = list(self.usage)
+        return data
+
+    def to_chat_message(self) -> ChatMessageContent:
+        metadata = {}
+        if self.usage:
+            metadata["usage"] = CompletionUsage(prompt_tokens=self.usage[0], completion_tokens=self.usage[1])
+        return ChatMessageContent(role=self.role, content=self.content, name=self.name, metadata=metadata)
+
+    def __repr__(self):
+        return f"<MessageRecord {self.role.value}:{self.name or '-'} {self.content[:30]!r}>"
+
+
+class LazyMessageList:
+    """
+    Lista de MessageRecord em que as mensagens já persistidas ficam no backend:
+    `fetch(start, end)` devolve os registros das posições [start, end) em uma
+    única leitura, e cada posição é decodificada no primeiro acesso. Faixas
+    (fatias, iteração, prefetch) são buscadas de uma vez. Mensagens novas
+    (append) ficam em memória normalmente.
+    """
+
+    def __init__(self, fetch: Optional[Callable[[int, int], List[Optional[Dict[str, Any]]]]] = None,
+                 persisted: int = 0):
+        self._fetch = fetch
+        self._persisted = persisted
+        self._items: List[Optional[MessageRecord]] = [None] * persisted
+        self.loaded = 0
+
+    def _decode(self, index: int, data: Optional[Dict[str, Any]]) -> MessageRecord:
+        try:
+            if data is None:
+                raise ValueError("registro ilegível")
+            return MessageRecord.from_dict(data)
+        except Exception as e:
+            # Registro corrompido: mantém a posição, sem conteúdo
+            logger.warning(f"[HISTORY] Registro inválido na posição {index}: {e}")
+            return MessageRecord(AuthorRole.SYSTEM, timestamp=0.0)
+
+    def prefetch(self, start: int, end: int) -> None:
+        """Decodifica as posições ainda não carregadas de [start, end) com uma única leitura"""
+        start, end = max(start, 0), min(end, self._persisted)
+        while start < end and self._items[start] is not None:
+            start += 1
+        while end > start and self._items[end - 1] is not None:
+            end -= 1
+        if start >= end:
+            return
+        for index, data in enumerate(self._fetch(start, end), start):
+            if self._items[index] is None:
+                self._items[index] = self._decode(index, data)
+                self.loaded += 1
+
+    def _get(self, index: int) -> MessageRecord:
+        record = self._items[index]
+        if record is None:
+            self.prefetch(index, index + 1)
+            record = self._items[index]
+        return record
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            positions = range(*index.indices(len(self._items)))
+            if positions:
+                self.prefetch(min(positions), max(positions) + 1)
+            return [self._get(i) for i in positions]
+        if index < 0:
+            index += len(self._items)
+        if not 0 <= index < len(self._items):
+            raise IndexError(index)
+        return self._get(index)
+
+    def __iter__(self) -> Iterator[MessageRecord]:
+        self.prefetch(0, len(self._items))
+        for index in range(len(self._items)):
+            yield self._get(index)
+
+    def __bool__(self) -> bool:
+        return bool(self._items)
+
+    def append(self, record: MessageRecord) -> None:
+        self._items.append(record)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._persisted = 0
+        self.loaded = 0
+
+    @property
+    def persisted(self) -> int:
+        """Quantidade de mensagens que vieram do backend"""
+        return self._persisted
+
+    def pending(self) -> int:
+        """Mensagens persistidas ainda não decodificadas"""
+        return self._persisted - self.loaded
@@ -1,9 +1,19 @@
+import asyncio
+import hashlib
 import logging
-from openai import OpenAI
-from typing import Dict, Any
+from openai import AsyncOpenAI
+from openai.types.moderation import CategoryScores
+from typing import Dict, Any, List, Optional, Tuple
+
+from .cache import TTLCache
+from .http_client import OpenAIClientFactory
 
 logger = logging.getLogger(__name__)
 
+MODERATION_MODEL = "omni-moderation-latest"
+# Campos de pontuação conhecidos, calculados uma vez (em vez de dir() a cada chamada)
+SCORE_FIELDS: Tuple[str, ...] = tuple(CategoryScores.model_fields)
+
 
 class ModerationResult:
     def __init__(self, flagged: bool, categories: Dict[str, bool], highest_score: float, provider: str):
@@ -17,43 +27,132 @@ class ModerationResult:
 
 
 class ContentModerator:
-    def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=api_key)
+    """
+    Moderação com cache por hash do conteúdo e agrupamento de requisições:
+    mensagens que chegam dentro da janela (batch_window) são enviadas juntas
+    em uma única chamada multi-input de moderations.create.
+    """
 
-    def analisar_mensagem(self, texto: str) -> ModerationResult:
-        try:
-            response = self.client.moderations.create(
-                input=texto,
-                model="omni-moderation-latest"  
-            )
+    def __init__(self, api_key: str, client_factory: Optional[OpenAIClientFactory] = None,
+                 batch_window: float = 0.01, max_batch_size: int = 32,
+                 cache_size: int = 10000, cache_ttl: float = 3600.0):
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._pending: List[Tuple[str, str, asyncio.Future]] = []
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._batch_tasks = set()
+        self.api_calls = 0
+        self.inputs_sent = 0
+        self.coalesced = 0
+
+        if client_factory:
+            self.async_client = client_factory.get_async_client()
+        else:
+            self.async_client = AsyncOpenAI(api_key=api_key)
+
+    def _content_key(self, texto: str) -> str:
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def _empty_result(self) -> ModerationResult:
+        return ModerationResult(flagged=False, categories={}, highest_score=0.0, provider="openai")
+
+    async def analisar_mensagem_async(self, texto: str) -> ModerationResult:
+        key = self._content_key(texto)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        future = self._inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._inflight[key] = future
+            self._pending.append((key, texto, future))
+
+            if len(self._pending) >= self.max_batch_size:
+                self._start_batch(loop, self._take_batch())
+            elif self._flush_task is None or self._flush_task.done():
+                self._flush_task = loop.create_task(self._flush_after_window())
+        else:
+            # Mesmo conteúdo já aguardando resposta: reaproveita a chamada
+            self.coalesced += 1
 
-            result = response.results[0]
-            highest_score = self._extract_highest_score(result.category_scores)
-            categories = self._extract_categories(result.categories)
+        # shield: o cancelamento de um chamador (ex.: preflight) não cancela o lote dos demais
+        return await asyncio.shield(future)
 
-            return ModerationResult(
-                flagged=result.flagged,
-                categories=categories,
-                highest_score=highest_score,
-                provider="openai"
+    def _take_batch(self) -> List[Tuple[str, str, asyncio.Future]]:
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _start_batch(self, loop, batch) -> None:
+        task = loop.create_task(self._send_batch(batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.batch_window)
+        # Libera a janela antes do envio: mensagens que chegarem durante a
+        # chamada abrem uma nova janela em vez de esperar este lote terminar
+        self._flush_task = None
+        batch = self._take_batch()
+        if batch:
+            self._start_batch(asyncio.get_running_loop(), batch)
+
+    async def _send_batch(self, batch: List[Tuple[str, str, asyncio.Future]]) -> None:
+        """Envia um lote em uma única chamada e resolve o futuro de cada mensagem"""
+        try:
+            response = await self.async_client.moderations.create(
+                input=[texto for _, texto, _ in batch],
+                model=MODERATION_MODEL
             )
+            self.api_calls += 1
+            self.inputs_sent += len(batch)
+            logger.debug(f"[MODERAÇÃO] Lote de {len(batch)} mensagens analisado")
+
+            for (key, _, future), item in zip(batch, response.results):
+                result = self._build_result(item)
+                self.cache.set(key, result)
+                if not future.done():
+                    future.set_result(result)
         except Exception as e:
             logger.warning(f"[MODERAÇÃO] Erro ao analisar conteúdo: {e}")
-            return ModerationResult(flagged=False, categories={}, highest_score=0.0, provider="openai")
+        finally:
+            for key, _, future in batch:
+                if not future.done():
+                    future.set_result(self._empty_result())
+                self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "api_calls": self.api_calls,
+            "inputs_sent": self.inputs_sent,
+            "coalesced": self.coalesced,
+            "avg_batch_size": round(self.inputs_sent / self.api_calls, 2) if self.api_calls else 0.0
+        }
+
+    def _build_result(self, result) -> ModerationResult:
+        highest_score = self._extract_highest_score(result.category_scores)
+        categories = self._extract_categories(result.categories)
+
+        return ModerationResult(
+            flagged=result.flagged,
+            categories=categories,
+            highest_score=highest_score,
+            provider="openai"
+        )
 
     def _extract_highest_score(self, category_scores) -> float:
         if not category_scores:
             return 0.0
-        
-        scores = []
-        for attr in dir(category_scores):
-            if not attr.startswith('_'):
-                try:
-                    score_value = getattr(category_scores, attr)
-                    if isinstance(score_value, (int, float)):
-                        scores.append(score_value)
-                except (AttributeError, TypeError):
-                    continue
+
+        if isinstance(category_scores, dict):
+            values = category_scores.values()
+        else:
+            values = (getattr(category_scores, field, None) for field in SCORE_FIELDS)
+        scores = [value for value in values if isinstance(value, (int, float))]
         return max(scores) if scores else 0.0
 
     def _extract_categories(self, categories) -> Dict[str, bool]:
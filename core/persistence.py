@@ -0,0 +1,101 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PersistenceWorker:
+    """
+    Grava o histórico fora do caminho da requisição: save() apenas marca a
+    sessão como pendente e uma thread dedicada faz a escrita. Vários saves da
+    mesma sessão antes da próxima passada viram uma única escrita (o log recebe
+    de uma vez todas as mensagens ainda não persistidas).
+    """
+
+    def __init__(self, name: str = "history-writer"):
+        self._pending: Dict[int, object] = {}
+        self._on_saved: Dict[int, Callable[[], None]] = {}
+        self._condition = threading.Condition()
+        self._busy = False
+        self._stopping = False
+        self.requests = 0
+        self.writes = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def save(self, manager, on_saved: Optional[Callable[[], None]] = None) -> None:
+        """
+        Agenda a gravação das mensagens pendentes do ChatHistoryManager.
+        `on_saved` roda na thread do worker logo após a gravação.
+        """
+        with self._condition:
+            if self._stopping:
+                # Encerrando: grava no próprio chamador para não perder nada
+                manager.save_history_sync()
+                if on_saved:
+                    on_saved()
+                return
+            self.requests += 1
+            self._pending[id(manager)] = manager
+            if on_saved:
+                self._on_saved[id(manager)] = on_saved
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if not self._pending and self._stopping:
+                    return
+                batch, self._pending = self._pending, {}
+                callbacks, self._on_saved = self._on_saved, {}
+                self._busy = True
+
+            for key, manager in batch.items():
+                try:
+                    manager.save_history_sync()
+                    self.writes += 1
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"[PERSIST] Erro ao gravar histórico em segundo plano: {e}")
+                if key in callbacks:
+                    try:
+                        callbacks[key]()
+                    except Exception as e:
+                        logger.error(f"[PERSIST] Erro após gravar histórico: {e}")
+
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Bloqueia até que todas as gravações agendadas terminem"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._pending or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """Drena a fila e encerra a thread (chamado no shutdown)"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        logger.info(f"[PERSIST] Worker encerrado: {self.stats()}")
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "writes": self.writes,
+            "coalesced": self.requests - self.writes - self.errors - len(self._pending),
+            "pending": len(self._pending),
+            "errors": self.errors
+        }
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from typing import Dict, Optional, Awaitable, Callable, Any
+import logging
+
+from .guardrails import GuardrailsManager, GuardrailResult
+from .moderation import ContentModerator, ModerationResult
+
+logger = logging.getLogger(__name__)
+
+
+class PreflightResult:
+    def __init__(
+        self,
+        blocked: bool,
+        blocked_by: str = "",
+        guardrail_result: Optional[GuardrailResult] = None,
+        moderation_result: Optional[ModerationResult] = None,
+        timings: Optional[Dict[str, float]] = None,
+        cancelled: Optional[list] = None,
+        total_time: float = 0.0,
+        cache_stats: Optional[Dict[str, Any]] = None
+    ):
+        self.blocked = blocked
+        self.blocked_by = blocked_by
+        self.guardrail_result = guardrail_result
+        self.moderation_result = moderation_result
+        self.timings = timings or {}
+        self.cancelled = cancelled or []
+        self.total_time = total_time
+        self.cache_stats = cache_stats or {}
+
+    def to_metrics(self) -> Dict[str, Any]:
+        return {
+            "total_time": self.total_time,
+            "checks": dict(self.timings),
+            "cancelled": list(self.cancelled),
+            "blocked_by": self.blocked_by or None,
+            "cache": dict(self.cache_stats)
+        }
+
+    def __repr__(self):
+        return f"<PreflightResult blocked={self.blocked} blocked_by='{self.blocked_by}'>"
+
+
+class PreflightChecker:
+    """
+    Executa guardrails (palavra-chave e semânticos) e moderação em paralelo.
+    Retorna no primeiro bloqueio e cancela as verificações restantes.
+    Verificações que passam de `timeout` segundos são canceladas e tratadas
+    como as que falham com erro (não bloqueiam a mensagem).
+    """
+
+    def __init__(self, guardrails: GuardrailsManager, moderator: ContentModerator, timeout: float = 10.0):
+        self.guardrails = guardrails
+        self.moderator = moderator
+        self.timeout = timeout
+
+    def _build_checks(self, texto: str) -> Dict[str, Callable[[], Awaitable[Any]]]:
+        checks: Dict[str, Callable[[], Awaitable[Any]]] = {}
+
+        async def keyword_check():
+            return self.guardrails.check_keywords(texto)
+
+        checks["guardrail:keywords"] = keyword_check
+
+        semantic_rules = self.guardrails.rule_set.semantic_rules
+
+        if self.guardrails.async_client and self.guardrails.prefilter and semantic_rules:
+            # As regras candidatas só são conhecidas depois dos embeddings
+            checks["guardrail:semantic"] = lambda: self.guardrails.check_semantic_prefiltered(texto)
+        elif self.guardrails.async_client and self.guardrails.use_batch(semantic_rules):
+            checks["guardrail:semantic_batch"] = lambda: self.guardrails.check_semantic_batch_async(texto, semantic_rules)
+        elif self.guardrails.async_client:
+            for rule in semantic_rules:
+                name = f"guardrail:{rule.get('name', 'Unknown')}"
+                checks[name] = lambda rule=rule: self.guardrails.check_semantic_async(texto, rule)
+
+        checks["moderation"] = lambda: self.moderator.analisar_mensagem_async(texto)
+        return checks
+
+    async def analisar(self, texto: str) -> PreflightResult:
+        start_time = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        async def timed(name: str, factory: Callable[[], Awaitable[Any]]):
+            check_start = time.perf_counter()
+            try:
+                return await factory()
+            finally:
+                timings[name] = round(time.perf_counter() - check_start, 3)
+
+        checks = self._build_checks(texto)
+        tasks = {asyncio.create_task(timed(name, factory)): name for name, factory in checks.items()}
+        order = list(checks.keys())
+        pending = set(tasks)
+        deadline = start_time + self.timeout
+        timed_out = []
+
+        try:
+            while pending:
+                remaining = deadline - time.perf_counter()
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(remaining, 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    timed_out = sorted(tasks[task] for task in pending)
+                    logger.error(f"[PREFLIGHT] Timeout de {self.timeout}s nas verificações: {', '.join(timed_out)}")
+                    break
+
+                # Respeitar a ordem de declaração quando várias terminam juntas
+                for task in sorted(done, key=lambda t: order.index(tasks[t])):
+                    name = tasks[task]
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.error(f"[PREFLIGHT] Erro na verificação {name}: {e}")
+                        continue
+
+                    if isinstance(result, GuardrailResult) and result.blocked:
+                        return self._blocked(name, pending, tasks, timings, start_time, guardrail_result=result)
+
+                    if isinstance(result, ModerationResult) and result.flagged:
+                        return self._blocked(name, pending, tasks, timings, start_time, moderation_result=result)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        total_time = round(time.perf_counter() - start_time, 3)
+        logger.debug(f"[PREFLIGHT] Aprovado em {total_time}s ({len(order)} verificações)")
+        return PreflightResult(
+            blocked=False,
+            timings=timings,
+            cancelled=timed_out,
+            total_time=total_time,
+            cache_stats=self._cache_stats()
+        )
+
+    def _cache_stats(self) -> Dict[str, Any]:
+        stats = {"semantic_guardrails": self.guardrails.cache_stats()}
+        if hasattr(self.moderator, "stats"):
+            stats["moderation"] = self.moderator.stats()
+        if self.guardrails.prefilter:
+            stats["semantic_prefilter"] = self.guardrails.prefilter.stats()
+        return stats
+
+    def _blocked(self, name, pending, tasks, timings, start_time, **results) -> PreflightResult:
+        cancelled = sorted(tasks[task] for task in pending)
+        for task in pending:
+            task.cancel()
+
+        total_time = round(time.perf_counter() - start_time, 3)
+        logger.info(f"[PREFLIGHT] Bloqueado por {name} em {total_time}s (canceladas: {len(cancelled)})")
+        return PreflightResult(
+            blocked=True,
+            blocked_by=name,
+            timings=dict(timings),
+            cancelled=cancelled,
+            total_time=total_time,
+            cache_stats=self._cache_stats(),
+            **results
+        )
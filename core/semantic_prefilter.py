@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import inspect
+import re
+import threading
+from typing import Awaitable, Dict, List, Optional, Protocol, Sequence, Union
+import logging
+
+import numpy as np
+
+from .keyword_matcher import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class Embedder(Protocol):
+    """Qualquer objeto que transforme textos em vetores (uma linha por texto)"""
+
+    def embed(self, textos: Sequence[str]) -> np.ndarray:
+        ...
+
+
+class AsyncEmbedder(Protocol):
+    """Embedder que consulta um serviço remoto sem bloquear o event loop"""
+
+    async def embed(self, textos: Sequence[str]) -> np.ndarray:
+        ...
+
+
+class HashingEmbedder:
+    """
+    Embedder local e determinístico (hashing trick sobre palavras e trigramas).
+    Só mede sobreposição de palavras, não significado: paráfrases de um tema
+    proibido ficam abaixo do limiar. Serve apenas para testes.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def _features(self, texto: str) -> List[str]:
+        palavras = _TOKEN_PATTERN.findall(normalizar_texto(texto))
+        features = [f"w:{palavra}" for palavra in palavras]
+        for palavra in palavras:
+            padded = f"#{palavra}#"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, textos: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(textos), self.dim), dtype=np.float32)
+        for row, texto in enumerate(textos):
+            for feature in self._features(texto):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                matrix[row, (value >> 1) % self.dim] += sign
+        return matrix
+
+
+class OpenAIEmbedder:
+    """Embedder da API de embeddings da OpenAI (cliente assíncrono compartilhado)"""
+
+    def __init__(self, async_client, model: str = "text-embedding-3-small"):
+        self.async_client = async_client
+        self.model = model
+
+    async def embed(self, textos: Sequence[str]) -> np.ndarray:
+        response = await self.async_client.embeddings.create(model=self.model, input=list(textos))
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class SemanticPrefilter:
+    """
+    Pré-filtro dos guardrails semânticos: as descrições das regras são
+    vetorizadas uma única vez e cada mensagem é comparada com todas elas
+    (similaridade de cosseno vetorizada). Só as regras acima do limiar seguem
+    para o juiz LLM. Se o embedder falhar, todas as regras seguem.
+    """
+
+    def __init__(self, embedder: Union[Embedder, AsyncEmbedder], threshold: float = 0.15):
+        self.embedder = embedder
+        self.threshold = threshold
+        self._rules: List[Dict] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._rule_ids: Dict[int, int] = {}
+        self._index_lock: Optional[asyncio.Lock] = None
+        self._lock = threading.Lock()
+        self.messages_checked = 0
+        self.messages_escalated = 0
+        self.rule_checks_avoided = 0
+
+    def _rule_text(self, rule: Dict) -> str:
+        keywords = " ".join(rule.get("keywords", []))
+        return f"{rule.get('name', '')} {rule.get('description', '')} {keywords}".strip()
+
+    async def _embed(self, textos: Sequence[str]) -> np.ndarray:
+        result: Union[np.ndarray, Awaitable[np.ndarray]] = self.embedder.embed(textos)
+        if inspect.isawaitable(result):
+            result = await result
+        return _normalize_rows(np.asarray(result, dtype=np.float32))
+
+    def index(self, rules: List[Dict]) -> None:
+        """Registra as regras (ao carregar/editar guardrails); os vetores são calculados no próximo uso"""
+        self._rules = list(rules)
+        self._matrix = None
+        self._rule_ids = {id(rule): row for row, rule in enumerate(self._rules)}
+
+    async def _ensure_index(self):
+        """(linha de cada regra, matriz) consistentes entre si; vetoriza as regras se preciso"""
+        while True:
+            rules, rule_ids, matrix = self._rules, self._rule_ids, self._matrix
+            if matrix is not None or not rules:
+                return rule_ids, matrix
+            if self._index_lock is None:
+                self._index_lock = asyncio.Lock()
+            async with self._index_lock:
+                if self._rules is not rules:
+                    continue  # regras editadas enquanto esperava
+                if self._matrix is None:
+                    self._matrix = await self._embed([self._rule_text(rule) for rule in rules])
+                    logger.info(f"[PREFILTER] {len(rules)} regras semânticas indexadas")
+                return rule_ids, self._matrix
+
+    async def score(self, texto: str, rules: List[Dict]) -> np.ndarray:
+        """Similaridade de cosseno entre a mensagem e cada regra informada"""
+        rule_ids, matrix = await self._ensure_index()
+        rows = [rule_ids.get(id(rule)) for rule in rules]
+        if matrix is None or any(row is None for row in rows):
+            self.index(rules)
+            rule_ids, matrix = await self._ensure_index()
+            rows = [rule_ids[id(rule)] for rule in rules]
+
+        vector = (await self._embed([texto]))[0]
+        return matrix[rows] @ vector
+
+    async def filter(self, texto: str, rules: List[Dict]) -> List[Dict]:
+        """Retorna apenas as regras que merecem ir ao LLM"""
+        if not rules:
+            return []
+
+        try:
+            scores = await self.score(texto, rules)
+        except Exception as e:
+            logger.warning(f"[PREFILTER] Falha ao calcular embeddings, verificando todas as regras: {e}")
+            return list(rules)
+        candidates = [rule for rule, score in zip(rules, scores) if score >= self.threshold]
+
+        with self._lock:
+            self.messages_checked += 1
+            self.rule_checks_avoided += len(rules) - len(candidates)
+            if candidates:
+                self.messages_escalated += 1
+
+        logger.debug(f"[PREFILTER] {len(candidates)}/{len(rules)} regras acima do limiar (máx={scores.max():.3f})")
+        return candidates
+
+    def stats(self) -> Dict:
+        checked = self.messages_checked
+        return {
+            "threshold": self.threshold,
+            "messages_checked": checked,
+            "messages_escalated": self.messages_escalated,
+            "escalations_avoided": checked - self.messages_escalated,
+            "rule_checks_avoided": self.rule_checks_avoided,
+            "escalation_rate": round(self.messages_escalated / checked, 3) if checked else 0.0
+        }
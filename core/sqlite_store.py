@@ -0,0 +1,239 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    seq INTEGER,
+    role TEXT NOT NULL,
+    name TEXT,
+    content TEXT NOT NULL DEFAULT '',
+    timestamp REAL NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    session_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history_state (
+    session_id TEXT PRIMARY KEY,
+    first_id INTEGER NOT NULL
+);
+"""
+
+# seq = posição da mensagem na sessão; páginas e buscas usam faixas de seq nos índices
+INDEXES = """
+DROP INDEX IF EXISTS idx_messages_session;
+DROP INDEX IF EXISTS idx_messages_agent;
+DROP INDEX IF EXISTS idx_messages_role;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_seq ON messages (session_id, seq);
+CREATE INDEX IF NOT EXISTS idx_messages_agent_seq ON messages (session_id, name, seq);
+CREATE INDEX IF NOT EXISTS idx_messages_role_seq ON messages (session_id, role, seq);
+CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (session_id, timestamp);
+"""
+
+COLUMNS = "role, name, content, timestamp, prompt_tokens, completion_tokens"
+
+
+class ConversationDatabase:
+    """
+    Banco SQLite (modo WAL) compartilhado por todas as sessões. Cada thread usa
+    a própria conexão: leituras do event loop não esperam as escritas do
+    worker de persistência.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        conn = self.connection()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+        conn.executescript(INDEXES)
+        logger.info(f"[HISTORY] Banco de conversas SQLite em {self.path}")
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """Bancos criados antes da coluna seq: numera as mensagens de cada sessão"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        if "seq" in columns:
+            return
+        with conn:
+            conn.execute("ALTER TABLE messages ADD COLUMN seq INTEGER")
+            conn.execute(
+                "UPDATE messages SET seq = ranked.position FROM ("
+                "SELECT id, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY id) - 1 AS position FROM messages"
+                ") AS ranked WHERE ranked.id = messages.id"
+            )
+        logger.info("[HISTORY] Banco de conversas migrado (coluna seq)")
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def list_sessions(self) -> List[str]:
+        rows = self.connection().execute("SELECT DISTINCT session_id FROM messages").fetchall()
+        return [row[0] for row in rows]
+
+    def delete_session(self, session_id: str) -> None:
+        with self.connection() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM history_state WHERE session_id = ?", (session_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def _record(row) -> Dict[str, Any]:
+    role, name, content, timestamp, prompt_tokens, completion_tokens = row
+    record = {"role": role, "name": name, "content": content, "timestamp": timestamp}
+    if prompt_tokens is not None:
+        record["usage"] = [prompt_tokens, completion_tokens]
+    return record
+
+
+class SQLiteHistoryStore:
+    """
+    Mensagens de uma sessão no ConversationDatabase. Em vez de scan/read_at
+    (um SELECT por mensagem), expõe consultas por posição (coluna seq):
+    count(), read_range() para uma faixa inteira em um único SELECT e find()
+    para buscas por papel/agente, todas resolvidas pelos índices.
+    """
+
+    def __init__(self, database: ConversationDatabase, session_id: str):
+        self.database = database
+        self.session_id = session_id
+
+    def count(self) -> int:
+        return self.database.connection().execute(
+            "SELECT COUNT(*) FROM messages WHERE session_id = ?", (self.session_id,)
+        ).fetchone()[0]
+
+    def first_id(self) -> int:
+        """Id da primeira mensagem (id = first_id + seq; cresce a cada clear)"""
+        row = self.database.connection().execute(
+            "SELECT first_id FROM history_state WHERE session_id = ?", (self.session_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def read_range(self, start: int, end: int) -> List[Dict[str, Any]]:
+        """Registros das posições [start, end), em ordem"""
+        rows = self.database.connection().execute(
+            f"SELECT {COLUMNS} FROM messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (self.session_id, start, end)
+        ).fetchall()
+        return [_record(row) for row in rows]
+
+    def load(self) -> List[Dict[str, Any]]:
+        return self.read_range(0, self.count())
+
+    def find(self, upto: int, count: Optional[int] = None, role: Optional[str] = None,
+             name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Registros (do mais recente para o mais antigo) com posição <= upto, filtrando por papel e/ou agente"""
+        query = f"SELECT {COLUMNS} FROM messages WHERE session_id = ? AND seq <= ?"
+        params: List[Any] = [self.session_id, upto]
+        if role is not None:
+            query += " AND role = ?"
+            params.append(role)
+        if name is not None:
+            query += " AND name = ?"
+            params.append(name)
+        query += " ORDER BY seq DESC"
+        if count is not None:
+            query += " LIMIT ?"
+            params.append(count)
+        return [_record(row) for row in self.database.connection().execute(query, params).fetchall()]
+
+    def _insert(self, conn: sqlite3.Connection, records: List[Dict[str, Any]]) -> None:
+        next_seq = conn.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE session_id = ?", (self.session_id,)
+        ).fetchone()[0]
+        rows = []
+        for seq, record in enumerate(records, next_seq):
+            usage = record.get("usage") or (None, None)
+            rows.append((
+                self.session_id, seq, record["role"], record.get("name"), record.get("content") or "",
+                record.get("timestamp", 0.0), usage[0], usage[1]
+            ))
+        conn.executemany(
+            "INSERT INTO messages (session_id, seq, role, name, content, timestamp, prompt_tokens, completion_tokens) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        with self.database.connection() as conn:
+            self._insert(conn, records)
+
+    def clear(self, live_count: int, first_id: int = 0) -> None:
+        with self.database.connection() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (self.session_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO history_state (session_id, first_id) VALUES (?, ?)",
+                (self.session_id, first_id)
+            )
+
+    def compact(self, records: List[Dict[str, Any]]) -> None:
+        """Substitui as mensagens da sessão em uma única transação"""
+        with self.database.connection() as conn:
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (self.session_id,))
+            self._insert(conn, records)
+
+    def release_reader(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteSummaryStore:
+    """Resumos hierárquicos de uma sessão (uma linha JSON por sessão)"""
+
+    def __init__(self, database: ConversationDatabase, session_id: str):
+        self.database = database
+        self.session_id = session_id
+
+    def load(self) -> List[Dict[str, Any]]:
+        row = self.database.connection().execute(
+            "SELECT data FROM summaries WHERE session_id = ?", (self.session_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def compact(self, records: List[Dict[str, Any]]) -> None:
+        with self.database.connection() as conn:
+            if records:
+                conn.execute(
+                    "INSERT OR REPLACE INTO summaries (session_id, data) VALUES (?, ?)",
+                    (self.session_id, json.dumps(records, ensure_ascii=False))
+                )
+            else:
+                conn.execute("DELETE FROM summaries WHERE session_id = ?", (self.session_id,))
+
+    def close(self) -> None:
+        pass
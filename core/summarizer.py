@@ -0,0 +1,127 @@
+import asyncio
+from typing import List, Optional
+import logging
+
+from .tokenizer import get_token_counter
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationSummarizer:
+    """
+    Resumo hierárquico de conversas longas, executado em segundo plano.
+    Quando uma sessão acumula `chunk_size` mensagens antigas (além das
+    `keep_recent` mais recentes), elas viram um resumo de nível 0; quando há
+    mais de `fanout` resumos, os mais antigos são fundidos em um resumo de nível
+    superior. Os agentes recebem apenas os resumos + a cauda recente.
+    """
+
+    def __init__(self, async_client=None, model: str = "gpt-4.1-mini",
+                 chunk_size: int = 20, keep_recent: int = 20, fanout: int = 4,
+                 max_summary_tokens: int = 250):
+        self.async_client = async_client
+        self.model = model
+        self.chunk_size = chunk_size
+        self.keep_recent = keep_recent
+        self.fanout = fanout
+        self.max_summary_tokens = max_summary_tokens
+        self.counter = get_token_counter()
+        self._running = set()
+        self._tasks = set()
+
+    def needs_summary(self, memory_manager) -> bool:
+        pending = memory_manager.message_count() - self.keep_recent - memory_manager.summarized_until
+        return pending >= self.chunk_size
+
+    def is_running(self, key: str) -> bool:
+        return key in self._running
+
+    def schedule(self, key: str, memory_manager) -> Optional[asyncio.Task]:
+        """Agenda o resumo da sessão (no máximo um por sessão em andamento)"""
+        if key in self._running or not self.needs_summary(memory_manager):
+            return None
+
+        self._running.add(key)
+        task = asyncio.get_running_loop().create_task(self._run(key, memory_manager))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, key: str, memory_manager) -> None:
+        try:
+            while self.needs_summary(memory_manager):
+                if not await self.fold(memory_manager):
+                    break
+        except Exception as e:
+            logger.warning(f"[SUMMARY] Falha ao resumir sessão {key}: {e}")
+        finally:
+            self._running.discard(key)
+
+    async def fold(self, memory_manager) -> bool:
+        """Resume o próximo bloco de mensagens antigas e funde níveis se necessário"""
+        generation = memory_manager.generation
+        start = memory_manager.summarized_until
+        end = memory_manager.message_count() - self.keep_recent
+        if end - start < self.chunk_size:
+            return False
+
+        messages = memory_manager.get_messages_range(start, end)
+        lines = [self._format(message) for message in messages]
+        content = await self._summarize(lines)
+
+        summaries = memory_manager.summaries + [{"level": 0, "start": start, "end": end, "content": content}]
+        while len(summaries) > self.fanout:
+            group = summaries[:self.fanout]
+            merged = await self._summarize([summary["content"] for summary in group])
+            summaries = [{
+                "level": max(summary["level"] for summary in group) + 1,
+                "start": group[0]["start"],
+                "end": group[-1]["end"],
+                "content": merged
+            }] + summaries[self.fanout:]
+
+        # Histórico limpo enquanto o resumo era gerado: descarta o resultado
+        if memory_manager.generation != generation:
+            return False
+
+        memory_manager.set_summaries(summaries)
+        logger.info(f"[SUMMARY] Mensagens {start}-{end} resumidas ({len(summaries)} resumos, "
+                    f"níveis {sorted({s['level'] for s in summaries})})")
+        return True
+
+    def _format(self, message) -> str:
+        role = "Usuário" if message.role.value == "user" else f"Assistente({message.name or 'Sistema'})"
+        return f"- {role}: {message.content}"
+
+    async def _summarize(self, lines: List[str]) -> str:
+        text = "\n".join(lines)
+        if self.async_client:
+            try:
+                response = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": "Você resume conversas de atendimento de forma fiel e compacta."},
+                        {"role": "user", "content": (
+                            "Resuma o trecho de conversa abaixo em no máximo 5 linhas. Preserve dados concretos "
+                            "(números de voo, assentos, datas, pedidos e decisões) e o que ficou pendente.\n\n"
+                            f"{text}"
+                        )}
+                    ],
+                    max_tokens=self.max_summary_tokens,
+                    temperature=0.1
+                )
+                content = (response.choices[0].message.content or "").strip()
+                if content:
+                    return content
+            except Exception as e:
+                logger.warning(f"[SUMMARY] Erro no resumo via LLM, usando resumo local: {e}")
+
+        return self._local_summary(lines)
+
+    def _local_summary(self, lines: List[str]) -> str:
+        """Resumo sem LLM: o início de cada mensagem, dentro do limite de tokens"""
+        per_line = max(8, self.max_summary_tokens // max(len(lines), 1))
+        return self.counter.truncate(
+            "\n".join(self.counter.truncate(line, per_line) for line in lines),
+            self.max_summary_tokens
+        )
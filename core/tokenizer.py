@@ -0,0 +1,68 @@
+import re
+from typing import Optional
+import logging
+
+try:
+    import tiktoken
+except ImportError:  # opcional: sem tiktoken usamos uma estimativa local
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+_HEURISTIC_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenCounter:
+    """
+    Contagem e truncamento de tokens sem chamar o LLM.
+    Usa o tiktoken quando instalado; caso contrário, estima ~4 caracteres por token
+    em cada palavra (pontuação conta 1 token).
+    """
+
+    def __init__(self, model: str = "gpt-4.1"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+        self.backend = "tiktoken" if self.encoding else "heuristic"
+
+    @staticmethod
+    def _estimate(piece: str) -> int:
+        return max(1, (len(piece) + 3) // 4)
+
+    def count(self, texto: str) -> int:
+        if not texto:
+            return 0
+        if self.encoding:
+            return len(self.encoding.encode(texto))
+        return sum(self._estimate(match.group()) for match in _HEURISTIC_PATTERN.finditer(texto))
+
+    def truncate(self, texto: str, max_tokens: int, suffix: str = "...") -> str:
+        """Corta o texto para caber em max_tokens (mantendo o início)"""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding:
+            tokens = self.encoding.encode(texto)
+            if len(tokens) <= max_tokens:
+                return texto
+            return self.encoding.decode(tokens[:max_tokens]) + suffix
+
+        used = 0
+        for match in _HEURISTIC_PATTERN.finditer(texto):
+            used += self._estimate(match.group())
+            if used > max_tokens:
+                return texto[:match.start()].rstrip() + suffix
+        return texto
+
+
+_default_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    global _default_counter
+    if _default_counter is None:
+        _default_counter = TokenCounter()
+        logger.info(f"[TOKENS] Contador de tokens: {_default_counter.backend}")
+    return _default_counter
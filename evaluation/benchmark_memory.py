@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memória do histórico de conversas.
+Compara um histórico de N mensagens guardado como ChatMessageContent (pydantic,
+com itens e metadados aninhados) com o mesmo histórico em MessageRecord.
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+# Adiciona o diretório raiz ao path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from semantic_kernel.connectors.ai.completion_usage import CompletionUsage
+from semantic_kernel.contents import ChatHistory, ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+from core.message_record import MessageRecord
+
+AGENTES = ["TechSupportAgent", "FlightStatusAgent", "SeatBookingAgent", "HRAgent"]
+
+
+def gerar_mensagens(total: int):
+    for i in range(total):
+        if i % 2 == 0:
+            yield ChatMessageContent(role=AuthorRole.USER, content=f"Mensagem {i}: qual o status do voo JJ{1000 + i % 9000}?")
+        else:
+            yield ChatMessageContent(
+                role=AuthorRole.ASSISTANT,
+                name=AGENTES[i % len(AGENTES)],
+                content=f"Resposta {i}: o voo está confirmado para as 14h, portão {i % 40}.",
+                metadata={"usage": CompletionUsage(prompt_tokens=500 + i % 100, completion_tokens=40)}
+            )
+
+
+def medir_memoria(construir):
+    """Bytes alocados (e ainda vivos) para construir a estrutura, e o tempo gasto"""
+    gc.collect()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    estrutura = construir()
+    duracao = time.perf_counter() - inicio
+    atual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return estrutura, atual, duracao
+
+
+def construir_chat_history(total: int) -> ChatHistory:
+    history = ChatHistory()
+    for message in gerar_mensagens(total):
+        history.add_message(message)
+    return history
+
+
+def construir_records(total: int):
+    return [MessageRecord.from_chat_message(message) for message in gerar_mensagens(total)]
+
+
+def run_benchmark(total: int = 10_000):
+    print("🧠 BENCHMARK - MEMÓRIA DO HISTÓRICO")
+    print("=" * 72)
+    print(f"Mensagens: {total}")
+    print()
+    print(f"{'Representação':<22} {'Memória (MB)':>13} {'Bytes/msg':>10} {'Construção (ms)':>16}")
+    print("-" * 72)
+
+    history, memoria_pydantic, tempo_pydantic = medir_memoria(lambda: construir_chat_history(total))
+    del history
+    records, memoria_records, tempo_records = medir_memoria(lambda: construir_records(total))
+
+    for nome, memoria, tempo in (
+        ("ChatMessageContent", memoria_pydantic, tempo_pydantic),
+        ("MessageRecord", memoria_records, tempo_records),
+    ):
+        print(f"{nome:<22} {memoria / 1024 / 1024:>13.2f} {memoria / total:>10.0f} {tempo * 1000:>16.1f}")
+
+    print()
+    print(f"📉 Redução de memória: {memoria_pydantic / memoria_records:.1f}x")
+
+    # Conversão sob demanda: só a cauda enviada ao agente vira ChatMessageContent
+    inicio = time.perf_counter()
+    cauda = [record.to_chat_message() for record in records[-20:]]
+    print(f"🔄 Conversão das últimas {len(cauda)} mensagens para o SK: "
+          f"{(time.perf_counter() - inicio) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Teste da busca de mensagens por agente em sessões recarregadas do disco.
+Só a cauda da sessão é indexada na carga; mensagens mais antigas do agente
+precisam vir do log, tanto no JSONL quanto no SQLite.
+"""
+
+import os
+import sys
+import tempfile
+
+# Adiciona o diretório raiz ao path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from semantic_kernel.contents import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+from core.memory_manager import ConversationMemoryManager
+from core.sqlite_store import ConversationDatabase
+
+
+def _verificar(conversations: ConversationMemoryManager) -> None:
+    manager = conversations.get_session("sessao")
+    # Respostas do agente só no início; depois uma cauda longa de outras mensagens
+    for i in range(3):
+        manager.add_message(ChatMessageContent(role=AuthorRole.ASSISTANT, name="TechSupportAgent",
+                                               content=f"resposta antiga {i}"))
+    for i in range(300):
+        manager.add_message(ChatMessageContent(role=AuthorRole.USER, content=f"mensagem {i}"))
+    conversations.evict_session("sessao")
+    conversations.flush_all()
+
+    manager = conversations.get_session("sessao")
+    assert manager._indexed_from > 3
+    recent = manager.get_recent_messages_by_agent("TechSupportAgent", count=5)
+    assert [m.content for m in recent] == [f"resposta antiga {i}" for i in range(3)]
+
+
+def test_agente_fora_da_cauda_jsonl():
+    with tempfile.TemporaryDirectory() as base_dir:
+        _verificar(ConversationMemoryManager(base_dir=base_dir))
+
+
+def test_agente_fora_da_cauda_sqlite():
+    with tempfile.TemporaryDirectory() as base_dir:
+        database = ConversationDatabase(os.path.join(base_dir, "conversations.db"))
+        _verificar(ConversationMemoryManager(base_dir=base_dir, database=database))
+
+
+if __name__ == "__main__":
+    test_agente_fora_da_cauda_jsonl()
+    test_agente_fora_da_cauda_sqlite()
+    print("✅ Busca por agente além da cauda carregada OK")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Teste da paginação do histórico (ChatHistoryManager.get_page).
+Os ids continuam crescendo depois de limpar o histórico (também após
+recarregar a sessão do disco) e mensagens sem conteúdo não encurtam a página.
+"""
+
+import os
+import sys
+import tempfile
+
+# Adiciona o diretório raiz ao path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from semantic_kernel.contents import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+from core.memory_manager import ConversationMemoryManager
+from core.sqlite_store import ConversationDatabase
+
+
+def _adicionar(manager, *conteudos: str) -> None:
+    for conteudo in conteudos:
+        manager.add_message(ChatMessageContent(role=AuthorRole.USER, content=conteudo))
+
+
+def _verificar_ids_apos_limpeza(conversations: ConversationMemoryManager) -> None:
+    manager = conversations.get_session("sessao")
+    _adicionar(manager, "a", "b", "c")
+    page, _, _, next_after = manager.get_page(10, after=-1)
+    assert [message_id for message_id, _ in page] == [0, 1, 2]
+
+    manager.clear_history()
+    _adicionar(manager, "d")
+    # Polling com o cursor de antes da limpeza não pode perder a mensagem nova
+    page, _, _, _ = manager.get_page(10, after=next_after)
+    assert [(message_id, m.content) for message_id, m in page] == [(3, "d")]
+
+    # Recarregada do disco, a sessão mantém a sequência
+    conversations.evict_session("sessao")
+    conversations.flush_all()
+    manager = conversations.get_session("sessao")
+    assert manager.first_id == 3
+    _adicionar(manager, "e")
+    page, _, _, _ = manager.get_page(10)
+    assert [(message_id, m.content) for message_id, m in page] == [(3, "d"), (4, "e")]
+
+
+def test_ids_apos_limpeza_jsonl():
+    with tempfile.TemporaryDirectory() as base_dir:
+        _verificar_ids_apos_limpeza(ConversationMemoryManager(base_dir=base_dir))
+
+
+def test_ids_apos_limpeza_sqlite():
+    with tempfile.TemporaryDirectory() as base_dir:
+        database = ConversationDatabase(os.path.join(base_dir, "conversations.db"))
+        _verificar_ids_apos_limpeza(ConversationMemoryManager(base_dir=base_dir, database=database))
+
+
+def test_mensagens_vazias_nao_encurtam_a_pagina():
+    with tempfile.TemporaryDirectory() as base_dir:
+        manager = ConversationMemoryManager(base_dir=base_dir).get_session("sessao")
+        _adicionar(manager, "a", "b", "", "", "c", "", "d")
+
+        page, has_more, next_before, _ = manager.get_page(3)
+        assert [m.content for _, m in page] == ["b", "c", "d"]
+        assert has_more and next_before == 1
+
+        page, _, _, next_after = manager.get_page(3, after=-1)
+        assert [m.content for _, m in page] == ["a", "b", "c"]
+        assert next_after == 4
+
+
+if __name__ == "__main__":
+    test_ids_apos_limpeza_jsonl()
+    test_ids_apos_limpeza_sqlite()
+    test_mensagens_vazias_nao_encurtam_a_pagina()
+    print("✅ Paginação do histórico OK")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Teste das escritas do histórico fora do event loop.
+Limpeza, resumos e descarregamento de sessão gravam no worker (ou no
+executor do loop, sem worker), e o resultado em disco continua correto.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+
+# Adiciona o diretório raiz ao path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from semantic_kernel.contents import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+from core.history_store import JsonlHistoryStore
+from core.memory_manager import ChatHistoryManager, ConversationMemoryManager
+from core.persistence import PersistenceWorker
+
+
+class ThreadRecordingStore(JsonlHistoryStore):
+    """JsonlHistoryStore que anota em qual thread cada escrita rodou"""
+
+    def __init__(self, path: str, threads: list):
+        super().__init__(path)
+        self.threads = threads
+
+    def append(self, records):
+        if records:
+            self.threads.append(threading.current_thread())
+        super().append(records)
+
+    def clear(self, live_count, first_id=0):
+        self.threads.append(threading.current_thread())
+        super().clear(live_count, first_id)
+
+    def compact(self, records):
+        self.threads.append(threading.current_thread())
+        super().compact(records)
+
+
+def _mensagem(texto: str) -> ChatMessageContent:
+    return ChatMessageContent(role=AuthorRole.USER, content=texto)
+
+
+def test_resumos_e_limpeza_no_worker():
+    with tempfile.TemporaryDirectory() as base_dir:
+        path = os.path.join(base_dir, "sessao.jsonl")
+        threads = []
+        worker = PersistenceWorker()
+        manager = ChatHistoryManager(
+            path, persistence=worker,
+            store=ThreadRecordingStore(path, threads),
+            summary_store=ThreadRecordingStore(os.path.join(base_dir, "sessao.summary.jsonl"), threads)
+        )
+        for i in range(3):
+            manager.add_message(_mensagem(f"antiga {i}"))
+        manager.save_history()
+        manager.set_summaries([{"level": 0, "start": 0, "end": 2, "content": "resumo antigo"}])
+        manager.clear_history()
+        manager.add_message(_mensagem("nova"))
+        manager.save_history()
+        worker.flush()
+        manager.flush()
+        worker.stop()
+
+        assert threads and all(thread is not threading.main_thread() for thread in threads)
+
+        recarregado = ChatHistoryManager(path)
+        assert [m.content for m in recarregado.get_history()] == ["nova"]
+        assert recarregado.summaries == []
+
+
+def test_descarregar_sem_worker_usa_executor():
+    async def cenario(base_dir: str):
+        conversations = ConversationMemoryManager(base_dir=base_dir)
+        manager = conversations.get_session("sessao")
+        threads = []
+        manager.store = ThreadRecordingStore(str(manager.persist_file), threads)
+        manager.add_message(_mensagem("pendente"))
+        conversations.evict_session("sessao")
+        assert "sessao" in conversations.list_sessions()
+        # Espera o executor terminar a gravação
+        for _ in range(100):
+            if not conversations._closing:
+                break
+            await asyncio.sleep(0.01)
+        return threads, conversations
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        threads, conversations = asyncio.run(cenario(base_dir))
+        assert threads and all(thread is not threading.main_thread() for thread in threads)
+        manager = conversations.get_session("sessao")
+        assert [m.content for m in manager.get_history()] == ["pendente"]
+
+
+if __name__ == "__main__":
+    test_resumos_e_limpeza_no_worker()
+    test_descarregar_sem_worker_usa_executor()
+    print("✅ Escritas do histórico fora do event loop OK")
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Teste do autômato de palavras-chave (KeywordMatcher).
+Recompilar depois de add() precisa dar o mesmo resultado que compilar uma vez.
+"""
+
+import os
+import sys
+
+# Adiciona o diretório raiz ao path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from core.keyword_matcher import KeywordMatcher
+
+
+def test_recompilar_apos_add():
+    matcher = KeywordMatcher([("b", 1)])
+    matcher.add("ab", 2)
+    matcher.compile()
+
+    assert sorted(matcher.find_all("ab")) == [("ab", 2), ("b", 1)]
+    # compile() repetido não pode duplicar saídas herdadas
+    matcher.compile()
+    assert sorted(matcher.find_all("ab")) == [("ab", 2), ("b", 1)]
+
+
+def test_recompilado_igual_ao_compilado_de_uma_vez():
+    palavras = [("senha", 0), ("férias", 1), ("as", 2), ("ferias pagas", 3), ("pagas", 4)]
+    texto = "Quero saber das FÉRIAS PAGAS e trocar a senha"
+
+    unico = KeywordMatcher(palavras)
+    incremental = KeywordMatcher(palavras[:2])
+    for palavra, payload in palavras[2:]:
+        incremental.add(palavra, payload)
+        incremental.compile()
+
+    assert sorted(incremental.find_all(texto)) == sorted(unico.find_all(texto))
+    assert incremental.find_best(texto) == ("senha", 0)
+
+
+if __name__ == "__main__":
+    test_recompilar_apos_add()
+    test_recompilado_igual_ao_compilado_de_uma_vez()
+    print("✅ KeywordMatcher OK")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Teste do agrupamento de chamadas de moderação (ContentModerator).
+Usa um cliente falso com latência real: uma mensagem que chega enquanto um
+lote está em voo precisa ser enviada em um novo lote, e não ficar esperando.
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+# Adiciona o diretório raiz ao path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from core.moderation import ContentModerator
+
+
+class SlowModerationClient:
+    """Simula moderations.create com latência de rede"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = []
+        self.moderations = self
+
+    async def create(self, input, model):
+        self.calls.append(list(input))
+        await asyncio.sleep(self.latency)
+        return SimpleNamespace(results=[
+            SimpleNamespace(flagged=False, categories={}, category_scores={}) for _ in input
+        ])
+
+
+def _moderator(latency: float) -> ContentModerator:
+    moderator = ContentModerator(api_key="test", batch_window=0.01)
+    moderator.async_client = SlowModerationClient(latency)
+    return moderator
+
+
+async def _mensagem_durante_lote_em_voo():
+    moderator = _moderator(latency=0.2)
+
+    primeira = asyncio.create_task(moderator.analisar_mensagem_async("primeira mensagem"))
+    await asyncio.sleep(0.05)  # janela fechou, lote da primeira está em voo
+    segunda = asyncio.create_task(moderator.analisar_mensagem_async("segunda mensagem"))
+
+    await asyncio.wait_for(asyncio.gather(primeira, segunda), timeout=2.0)
+    assert moderator.async_client.calls == [["primeira mensagem"], ["segunda mensagem"]]
+    assert not moderator._pending
+
+
+async def _rajada_com_latencia():
+    moderator = _moderator(latency=0.05)
+
+    textos = [f"mensagem {i}" for i in range(100)]
+    tarefas = []
+    for texto in textos:
+        tarefas.append(asyncio.create_task(moderator.analisar_mensagem_async(texto)))
+        await asyncio.sleep(0.001)
+
+    resultados = await asyncio.wait_for(asyncio.gather(*tarefas), timeout=5.0)
+    assert len(resultados) == len(textos)
+    enviados = [texto for chamada in moderator.async_client.calls for texto in chamada]
+    assert sorted(enviados) == sorted(textos)
+    assert not moderator._pending and not moderator._inflight
+
+
+def test_mensagem_durante_lote_em_voo():
+    asyncio.run(_mensagem_durante_lote_em_voo())
+
+
+def test_rajada_com_latencia():
+    asyncio.run(_rajada_com_latencia())
+
+
+if __name__ == "__main__":
+    test_mensagem_durante_lote_em_voo()
+    test_rajada_com_latencia()
+    print("✅ Agrupamento de moderação OK")
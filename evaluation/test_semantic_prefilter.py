@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Teste do pré-filtro semântico dos guardrails (SemanticPrefilter).
+Uma paráfrase de um tema proibido, sem nenhuma palavra-chave da regra,
+precisa passar pelo pré-filtro e chegar ao juiz LLM.
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+# Adiciona o diretório raiz ao path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from core.guardrails import GuardrailsManager
+from core.keyword_matcher import normalizar_texto
+from core.moderation import ModerationResult
+from core.preflight import PreflightChecker
+from core.semantic_prefilter import HashingEmbedder, SemanticPrefilter
+
+PARAFRASES = [
+    "robôs alienígenas que viram caminhão",
+    "Qual é o nome do carro amarelo que vira robô, o Bumblebee?",
+]
+
+# Conceitos que um modelo de embeddings real aproxima (sinônimos sem palavras em comum)
+CONCEITOS = {
+    "robo": 0, "robos": 0, "transformers": 0, "autobots": 0, "decepticons": 0, "bumblebee": 0,
+    "alienigenas": 0, "vira": 0, "viram": 0, "filme": 0, "desenho": 0,
+    "caminhao": 1, "carro": 1,
+    "voo": 2, "status": 2, "assento": 2, "passagem": 2,
+}
+
+
+class ConceptEmbedder:
+    """Embedder assíncrono de teste que se comporta como um modelo semântico"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def embed(self, textos):
+        self.calls += 1
+        matrix = np.zeros((len(textos), 4), dtype=np.float32)
+        for row, texto in enumerate(textos):
+            for palavra in normalizar_texto(texto).replace("?", " ").replace(",", " ").split():
+                matrix[row, CONCEITOS.get(palavra, 3)] += 1.0 if palavra in CONCEITOS else 0.1
+        return matrix
+
+
+class FailingEmbedder:
+    async def embed(self, textos):
+        raise RuntimeError("serviço de embeddings indisponível")
+
+
+class JudgeClient:
+    """Juiz LLM falso: bloqueia tudo e registra as chamadas"""
+
+    def __init__(self):
+        self.calls = []
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs["messages"][-1]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="BLOCK tema proibido"))])
+
+
+class ApprovingModerator:
+    async def analisar_mensagem_async(self, texto):
+        return ModerationResult(flagged=False, categories={}, highest_score=0.0, provider="test")
+
+
+def _checker(embedder):
+    guardrails = GuardrailsManager(config_path=os.path.join(root_dir, "config", "guardrails_config.json"))
+    guardrails.async_client = JudgeClient()
+    guardrails.enable_prefilter(SemanticPrefilter(embedder, threshold=0.15))
+    return PreflightChecker(guardrails, ApprovingModerator()), guardrails.async_client
+
+
+def test_parafrase_chega_ao_juiz_llm():
+    for texto in PARAFRASES:
+        checker, judge = _checker(ConceptEmbedder())
+        result = asyncio.run(checker.analisar(texto))
+        assert len(judge.calls) == 1, texto
+        assert result.blocked and result.guardrail_result.guardrail_name == "TransformersGuardrail"
+
+
+def test_mensagem_sem_relacao_nao_chama_o_juiz():
+    checker, judge = _checker(ConceptEmbedder())
+    result = asyncio.run(checker.analisar("qual o status do voo JJ1234?"))
+    assert not result.blocked
+    assert judge.calls == []
+
+
+def test_falha_nos_embeddings_verifica_todas_as_regras():
+    checker, judge = _checker(FailingEmbedder())
+    asyncio.run(checker.analisar("qual o status do voo JJ1234?"))
+    assert len(judge.calls) == 1
+
+
+def test_hashing_embedder_nao_serve_para_producao():
+    # Só mede sobreposição de palavras: as paráfrases ficam abaixo do limiar
+    prefilter = SemanticPrefilter(HashingEmbedder(), threshold=0.15)
+    guardrails = GuardrailsManager(config_path=os.path.join(root_dir, "config", "guardrails_config.json"))
+    rules = guardrails.rule_set.semantic_rules
+    for texto in PARAFRASES:
+        assert asyncio.run(prefilter.filter(texto, rules)) == []
+
+
+if __name__ == "__main__":
+    test_parafrase_chega_ao_juiz_llm()
+    test_mensagem_sem_relacao_nao_chama_o_juiz()
+    test_falha_nos_embeddings_verifica_todas_as_regras()
+    test_hashing_embedder_nao_serve_para_producao()
+    print("✅ Pré-filtro semântico OK")
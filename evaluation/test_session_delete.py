@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Teste de exclusão de sessões (ConversationMemoryManager).
+Apagar uma sessão e recriá-la com o mesmo id precisa começar do zero:
+nem mensagens nem resumos da conversa apagada podem voltar.
+"""
+
+import os
+import sys
+import tempfile
+
+# Adiciona o diretório raiz ao path
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root_dir)
+
+from semantic_kernel.contents import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+from core.memory_manager import ConversationMemoryManager
+from core.sqlite_store import ConversationDatabase
+
+
+def _popular(conversations: ConversationMemoryManager, session_id: str) -> None:
+    manager = conversations.get_session(session_id)
+    for i in range(4):
+        manager.add_message(ChatMessageContent(role=AuthorRole.USER, content=f"mensagem secreta {i}"))
+    manager.set_summaries([{"level": 0, "start": 0, "end": 2, "content": "resumo da conversa secreta"}])
+    manager.set_summaries([{"level": 0, "start": 0, "end": 3, "content": "resumo da conversa secreta"}])
+    conversations.flush_all()
+
+
+def _verificar_recriada(conversations: ConversationMemoryManager, session_id: str) -> None:
+    conversations.delete_session(session_id)
+    assert session_id not in conversations.list_sessions()
+    # Nenhum arquivo da sessão (log, resumos, gerações anteriores) pode sobrar
+    assert not list(conversations.base_dir.glob(f"{session_id}.*"))
+
+    manager = conversations.get_session(session_id)
+    assert manager.message_count() == 0
+    assert manager.summaries == []
+
+    # A nova conversa cresce além do trecho resumido da antiga e é recarregada do disco
+    for i in range(4):
+        manager.add_message(ChatMessageContent(role=AuthorRole.USER, content=f"mensagem nova {i}"))
+    conversations.evict_session(session_id)
+    manager = conversations.get_session(session_id)
+    assert manager.message_count() == 4
+    assert manager.summaries == []
+    assert "secreta" not in manager.summary_text()
+
+
+def test_excluir_e_recriar_jsonl():
+    with tempfile.TemporaryDirectory() as base_dir:
+        conversations = ConversationMemoryManager(base_dir=base_dir)
+        _popular(conversations, "cliente-1")
+
+        arquivos = set(os.listdir(base_dir))
+        assert "cliente-1.summary.jsonl" in arquivos
+        # O arquivo de resumos não é listado como sessão
+        assert conversations.list_sessions() == ["cliente-1"]
+
+        _verificar_recriada(conversations, "cliente-1")
+        conversations.flush_all()
+
+
+def test_excluir_e_recriar_sqlite():
+    with tempfile.TemporaryDirectory() as base_dir:
+        database = ConversationDatabase(os.path.join(base_dir, "conversations.db"))
+        conversations = ConversationMemoryManager(base_dir=base_dir, database=database)
+        _popular(conversations, "cliente-1")
+        _verificar_recriada(conversations, "cliente-1")
+        database.close()
+
+
+if __name__ == "__main__":
+    test_excluir_e_recriar_jsonl()
+    test_excluir_e_recriar_sqlite()
+    print("✅ Exclusão de sessões OK")
@@ -69,8 +69,8 @@ async def main():
                 
                 if user_input.lower() == "historico":
                     print("\n📋 Histórico da conversa:")
-                    historico = orquestrador.obter_historico()
-                    for i, msg in enumerate(historico[-10:], 1):  # Últimas 10 mensagens
+                    historico = orquestrador.obter_historico(limit=10)
+                    for i, msg in enumerate(historico, 1):  # Últimas 10 mensagens
                         role_icon = "👤" if msg.role.value == "user" else "🤖"
                         print(f"  {i}. {role_icon} {msg.name or msg.role.value}: {msg.content}")
                     continue
@@ -114,6 +114,7 @@ async def main():
             
             if 'orquestrador' in locals():
                 orquestrador.memory_manager.save_history()
+                orquestrador.memory_manager.flush()
         except Exception as e:
             print(f"⚠️ Erro durante cleanup: {e}")
         
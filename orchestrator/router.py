@@ -0,0 +1,268 @@
+import math
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+import logging
+
+import numpy as np
+
+from core.keyword_matcher import KeywordMatcher, normalizar_texto
+from core.semantic_prefilter import Embedder
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = frozenset(normalizar_texto(word) for word in (
+    "a o as os um uma uns umas de do da dos das em no na nos nas por para com sem "
+    "que se e ou mas como qual quais quando onde meu minha seu sua ele ela eles elas "
+    "voce voces eu nos isso isto esse essa este esta ser estar ter foi sao esta "
+    "nao sim mais muito pode posso quero gostaria preciso ajuda ajude sobre"
+).split())
+
+
+# Frases que indicam que o TriageAgent tentou "transferir" em texto em vez de chamar o handoff
+HANDOFF_TERMS = ("transfer", "handoff", "delegate", "routing")
+HANDOFF_INDICATORS = (
+    "vou encaminhar", "direcionando", "transferindo", "redirecionando",
+    "aguarde um instante", "setor responsável", "especialista", "departamento"
+)
+
+DEFAULT_ROUTING_PRIORITY = 100
+
+
+def _compile_indicators(*groups) -> KeywordMatcher:
+    return KeywordMatcher((phrase, 0) for group in groups for phrase in group)
+
+
+_handoff_matcher = _compile_indicators(HANDOFF_TERMS, HANDOFF_INDICATORS)
+_routing_failure_matcher = _compile_indicators(HANDOFF_TERMS, HANDOFF_INDICATORS, ("suporte técnico",))
+_handoff_terms_matcher = _compile_indicators(HANDOFF_TERMS[:3])
+
+
+def parece_handoff_textual(texto: str, incluir_suporte: bool = False) -> bool:
+    """Detecta respostas do TriageAgent que descrevem um handoff em vez de executá-lo"""
+    matcher = _routing_failure_matcher if incluir_suporte else _handoff_matcher
+    return matcher.find_best(texto) is not None
+
+
+def menciona_handoff(texto: str) -> bool:
+    """Termos técnicos de handoff (transfer/handoff/delegate) no resultado da orquestração"""
+    return _handoff_terms_matcher.find_best(texto) is not None
+
+
+class KeywordRouter:
+    """
+    Roteamento determinístico a partir do campo "routing" de cada agente:
+    {"keywords": [...], "patterns": [...], "priority": n}. As palavras-chave de
+    todos os agentes viram um único autômato Aho-Corasick e os padrões uma
+    única regex combinada, então cada mensagem é analisada em uma passada.
+    Em caso de várias correspondências vence a menor prioridade (e depois a
+    ordem na configuração).
+    """
+
+    def __init__(self, agentes_config: List[Dict]):
+        self.matcher = KeywordMatcher()
+        self.pattern: Optional[re.Pattern] = None
+        self._pattern_agents: Dict[str, tuple] = {}
+        self.agents: List[str] = []
+
+        alternatives = []
+        for order, config in enumerate(agentes_config):
+            routing = config.get("routing") or {}
+            if config["name"] == "TriageAgent" or not routing:
+                continue
+
+            rank = (routing.get("priority", DEFAULT_ROUTING_PRIORITY), order, config["name"])
+            self.agents.append(config["name"])
+            for keyword in routing.get("keywords") or []:
+                self.matcher.add(keyword, rank)
+            for pattern in routing.get("patterns") or []:
+                group = f"r{len(alternatives)}"
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    logger.warning(f"[ROUTER] Padrão inválido ignorado em {config['name']}: {pattern} ({e})")
+                    continue
+                alternatives.append(f"(?P<{group}>{pattern})")
+                self._pattern_agents[group] = rank
+
+        self.matcher.compile()
+        if alternatives:
+            self.pattern = re.compile("|".join(alternatives), re.IGNORECASE)
+        logger.info(f"[ROUTER] Roteamento por palavras-chave: {len(self.matcher)} palavras, "
+                    f"{len(alternatives)} padrões, {len(self.agents)} agentes")
+
+    def match(self, texto: str) -> Optional[str]:
+        """Nome do agente de maior prioridade encontrado na mensagem, ou None"""
+        best = None
+        keyword_match = self.matcher.find_best(texto)
+        if keyword_match:
+            best = keyword_match[1]
+
+        if self.pattern is not None:
+            for found in self.pattern.finditer(texto):
+                rank = self._pattern_agents[found.lastgroup]
+                if best is None or rank < best:
+                    best = rank
+
+        return best[2] if best else None
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Tokens normalizados, sem stopwords e truncados em 6 letras (radical aproximado)"""
+    return [
+        token[:6] for token in _TOKEN_PATTERN.findall(normalizar_texto(texto))
+        if len(token) > 2 and token not in STOPWORDS
+    ]
+
+
+class TfidfEmbedder:
+    """TF-IDF local em NumPy, ajustado sobre os textos dos agentes"""
+
+    def __init__(self):
+        self.vocabulary: Dict[str, int] = {}
+        self.idf: Optional[np.ndarray] = None
+
+    def fit(self, documents: Sequence[str]) -> "TfidfEmbedder":
+        document_frequency = Counter()
+        for document in documents:
+            document_frequency.update(set(tokenizar(document)))
+
+        self.vocabulary = {term: index for index, term in enumerate(sorted(document_frequency))}
+        total = len(documents)
+        self.idf = np.array(
+            [math.log((1 + total) / (1 + document_frequency[term])) + 1.0 for term in self.vocabulary],
+            dtype=np.float32
+        )
+        return self
+
+    def embed(self, textos: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(textos), len(self.vocabulary)), dtype=np.float32)
+        for row, texto in enumerate(textos):
+            for term, count in Counter(tokenizar(texto)).items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    matrix[row, column] = 1.0 + math.log(count)
+        if self.idf is not None:
+            matrix *= self.idf
+        return matrix
+
+
+class RoutingDecision:
+    def __init__(self, agent: Optional[str], confidence: float, margin: float,
+                 scores: Dict[str, float], latency: float):
+        self.agent = agent
+        self.confidence = confidence
+        self.margin = margin
+        self.scores = scores
+        self.latency = latency
+
+    @property
+    def fast_path(self) -> bool:
+        return self.agent is not None
+
+    def to_metrics(self) -> Dict:
+        return {
+            "fast_path": self.fast_path,
+            "agent": self.agent,
+            "confidence": round(self.confidence, 3),
+            "margin": round(self.margin, 3),
+            "latency_ms": round(self.latency * 1000, 3)
+        }
+
+    def __repr__(self):
+        return f"<RoutingDecision agent={self.agent} confidence={self.confidence:.3f}>"
+
+
+class LocalRouter:
+    """
+    Roteador local por centróide mais próximo: cada agente é representado pela
+    média dos vetores de suas frases de exemplo (description, instructions e
+    "examples" da configuração). Roteia direto quando a confiança e a margem
+    para o segundo colocado são suficientes; caso contrário retorna agent=None
+    e a triagem por LLM decide.
+    """
+
+    def __init__(self, agentes_config: List[Dict], embedder: Optional[Embedder] = None,
+                 threshold: float = 0.15, min_margin: float = 0.08):
+        self.embedder = embedder or TfidfEmbedder()
+        self.threshold = threshold
+        self.min_margin = min_margin
+        self.agent_names: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.fast_path_count = 0
+        self.total_latency = 0.0
+        self.fit(agentes_config)
+
+    def _utterances(self, config: Dict) -> List[str]:
+        utterances = [config.get("description", "")]
+        utterances.extend(_SENTENCE_PATTERN.split(config.get("instructions", "")))
+        utterances.extend(config.get("examples") or [])
+        return [utterance for utterance in utterances if utterance.strip()]
+
+    def fit(self, agentes_config: List[Dict]) -> None:
+        """(Re)constrói os centróides a partir da configuração dos agentes"""
+        configs = [config for config in agentes_config if config["name"] != "TriageAgent"]
+        utterances = {config["name"]: self._utterances(config) for config in configs}
+
+        # Sob o lock: o vocabulário do embedder e os centróides mudam juntos
+        with self._lock:
+            if hasattr(self.embedder, "fit"):
+                self.embedder.fit([" ".join(texts) for texts in utterances.values()])
+
+            centroids = []
+            for texts in utterances.values():
+                vectors = self.embedder.embed(texts)
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                centroid = (vectors / norms).mean(axis=0)
+                norm = np.linalg.norm(centroid)
+                centroids.append(centroid / norm if norm else centroid)
+
+            self.agent_names = list(utterances)
+            self.centroids = np.vstack(centroids) if centroids else None
+        logger.info(f"[ROUTER] Centróides construídos para {len(self.agent_names)} agentes")
+
+    def route(self, texto: str) -> RoutingDecision:
+        start = time.perf_counter()
+        agent, confidence, margin, scores = None, 0.0, 0.0, {}
+
+        with self._lock:
+            if self.centroids is not None:
+                vector = self.embedder.embed([texto])[0]
+                norm = np.linalg.norm(vector)
+                if norm:
+                    similarities = self.centroids @ (vector / norm)
+                    order = np.argsort(similarities)[::-1]
+                    confidence = float(similarities[order[0]])
+                    margin = confidence - float(similarities[order[1]]) if len(order) > 1 else confidence
+                    scores = {self.agent_names[i]: round(float(similarities[i]), 3) for i in order[:3]}
+                    if confidence >= self.threshold and margin >= self.min_margin:
+                        agent = self.agent_names[order[0]]
+
+            latency = time.perf_counter() - start
+            self.requests += 1
+            self.total_latency += latency
+            if agent:
+                self.fast_path_count += 1
+
+        decision = RoutingDecision(agent, confidence, margin, scores, latency)
+        logger.debug(f"[ROUTER] {decision} scores={scores}")
+        return decision
+
+    def stats(self) -> Dict:
+        requests = self.requests
+        return {
+            "requests": requests,
+            "fast_path": self.fast_path_count,
+            "fast_path_share": round(self.fast_path_count / requests, 3) if requests else 0.0,
+            "avg_latency_ms": round(self.total_latency / requests * 1000, 3) if requests else 0.0,
+            "threshold": self.threshold,
+            "min_margin": self.min_margin
+        }
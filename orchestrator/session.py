@@ -0,0 +1,30 @@
+import asyncio
+from typing import Dict, Any, Optional
+
+from core.memory_manager import ChatHistoryManager
+
+
+class ConversationSession:
+    """
+    Estado de uma conversa individual: histórico e estado de roteamento.
+    Cada sessão processa uma mensagem por vez (lock), sessões diferentes rodam em paralelo.
+    """
+
+    def __init__(self, session_id: str, memory_manager: ChatHistoryManager):
+        self.session_id = session_id
+        self.memory_manager = memory_manager
+        self.last_agent_response: Optional[Dict[str, str]] = None
+        self.last_performance_metrics: Dict[str, Any] = {}
+        self.displayed_messages = set()
+        self.lock = asyncio.Lock()
+        # Fila de eventos do streaming (SSE); None quando ninguém está ouvindo
+        self.events: Optional[asyncio.Queue] = None
+        self.streaming_agent: Optional[str] = None
+
+    def emit(self, event: str, **data) -> None:
+        """Publica um evento para o cliente em streaming (no-op fora do streaming)"""
+        if self.events is not None:
+            self.events.put_nowait({"event": event, "data": data})
+
+    def __repr__(self):
+        return f"<ConversationSession id={self.session_id} messages={self.memory_manager.message_count()}>"
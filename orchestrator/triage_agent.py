@@ -1,17 +1,28 @@
 import sys
 import os
 import asyncio
+import time
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Optional
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from semantic_kernel import Kernel
 from semantic_kernel.agents import ChatCompletionAgent, HandoffOrchestration, OrchestrationHandoffs
 from semantic_kernel.agents.runtime import InProcessRuntime
 from semantic_kernel.connectors.ai.open_ai import OpenAIChatCompletion
-from semantic_kernel.contents import ChatMessageContent, AuthorRole
+from semantic_kernel.contents import ChatMessageContent, StreamingChatMessageContent, AuthorRole
 
-from core.memory_manager import ChatHistoryManager
+from core.memory_manager import ChatHistoryManager, ConversationMemoryManager, DEFAULT_SESSION_ID
+from core.message_record import MessageRecord
 from core.moderation import ContentModerator
 from core.guardrails import GuardrailsManager
+from core.preflight import PreflightChecker
+from core.http_client import OpenAIClientFactory
+from core.context_window import empacotar
+from core.tokenizer import get_token_counter
+from core.summarizer import ConversationSummarizer
+from orchestrator.session import ConversationSession
+from orchestrator.router import LocalRouter, KeywordRouter, parece_handoff_textual, menciona_handoff
 
 import logging
 
@@ -24,26 +35,48 @@ class TriageAgent:
     para roteamento dinâmico entre agentes especialistas.
     """
     
-    def __init__(self, agentes_config: list[dict], api_key: str):
+    def __init__(
+        self,
+        agentes_config: list[dict],
+        api_key: str,
+        conversations: Optional[ConversationMemoryManager] = None,
+        client_factory: Optional[OpenAIClientFactory] = None,
+        context_budget: int = 1500
+    ):
         self.agentes_config = agentes_config
+        # Orçamento de tokens do contexto (padrão); agentes podem sobrescrever em settings.context_token_budget
+        self.context_budget = context_budget
+        self.token_counter = get_token_counter()
         self.api_key = api_key
         self.specialist_agents = {}
-        self.handoff_orchestration = None
+        self.handoffs = None
         self.runtime = None
 
-        self.memory_manager = ChatHistoryManager()
-        self.moderator = ContentModerator(api_key=self.api_key)
-        self.guardrails = GuardrailsManager(api_key=self.api_key)
+        self.conversations = conversations or ConversationMemoryManager(default_file="chat_history.jsonl")
+        self.conversations.on_evict = self._drop_session
+        self.conversations.in_use = self._session_in_use
+        self._sessions: Dict[str, ConversationSession] = {}
+
+        self.client_factory = client_factory or OpenAIClientFactory(api_key=self.api_key)
+
+        self.moderator = ContentModerator(api_key=self.api_key, client_factory=self.client_factory)
+        self.guardrails = GuardrailsManager(api_key=self.api_key, client_factory=self.client_factory)
+        self.preflight = PreflightChecker(self.guardrails, self.moderator)
+        self.summarizer = ConversationSummarizer(async_client=self.client_factory.get_async_client())
 
         self._setup_agents()
         self._setup_handoff_orchestration()
+        self.keyword_router = KeywordRouter(self.agentes_config)
+        # Roteador local (fast path); None desativa e tudo passa pela triagem LLM
+        self.router: Optional[LocalRouter] = LocalRouter(self.agentes_config)
     
     def _setup_agents(self):
         
         service = OpenAIChatCompletion(
             service_id="openai-triage",
             ai_model_id="gpt-4.1",  
-            api_key=self.api_key
+            api_key=self.api_key,
+            async_client=self.client_factory.get_async_client()
         )
         
         kernel = Kernel()
@@ -83,55 +116,127 @@ class TriageAgent:
         
         for config in self.agentes_config:
             if config["name"] != "TriageAgent": 
-                from agents.specialist_agent import criar_agente_especialista
-                specialist_agent = criar_agente_especialista(config, self.api_key)
-                self.specialist_agents[config["name"]] = specialist_agent
+                self.specialist_agents[config["name"]] = self._create_specialist(config)
+    
+    def _create_specialist(self, config: dict) -> ChatCompletionAgent:
+        from agents.specialist_agent import criar_agente_especialista
+        return criar_agente_especialista(config, self.api_key, self.client_factory)
     
     def _setup_handoff_orchestration(self):
+        self.handoffs = self._build_handoffs(self.specialist_agents)
+    
+    def _build_handoffs(self, specialist_agents: Dict[str, ChatCompletionAgent]) -> OrchestrationHandoffs:
         handoffs = (
             OrchestrationHandoffs()
             .add_many(
                 source_agent=self.triage_agent.name,
                 target_agents={
                     agent_name: f"Transfer to this agent if the issue is related to {agent.description.lower()}"
-                    for agent_name, agent in self.specialist_agents.items()
+                    for agent_name, agent in specialist_agents.items()
                 }
             )
         )
         
-        for agent_name in self.specialist_agents.keys():
+        for agent_name in specialist_agents.keys():
             handoffs.add(
                 source_agent=agent_name,
                 target_agent=self.triage_agent.name,
                 description="Transfer back to triage if the issue is not related to my expertise"
             )
         
+        return handoffs
+    
+    def aplicar_configuracao(self, agentes_config: list[dict]) -> dict:
+        """
+        Reconfiguração incremental: recria apenas os especialistas alterados e,
+        se o conjunto de agentes ou descrições mudou, o grafo de handoff.
+        Sessões, runtime e clientes HTTP são preservados.
+        """
+        old = {c["name"]: c for c in self.agentes_config if c["name"] != "TriageAgent"}
+        new = {c["name"]: c for c in agentes_config if c["name"] != "TriageAgent"}
+        
+        added = [name for name in new if name not in old]
+        removed = [name for name in old if name not in new]
+        changed = [name for name in new if name in old and new[name] != old[name]]
+        
+        specialist_agents = {}
+        for name, config in new.items():
+            if name in added or name in changed:
+                specialist_agents[name] = self._create_specialist(config)
+            else:
+                specialist_agents[name] = self.specialist_agents[name]
+        
+        rebuild_handoffs = bool(added or removed) or any(
+            new[name]["description"] != old[name]["description"] for name in changed
+        )
+        handoffs = self._build_handoffs(specialist_agents) if rebuild_handoffs else self.handoffs
+        keyword_router = KeywordRouter(agentes_config)
+        if self.router:
+            self.router.fit(agentes_config)
+        
+        # Troca atômica: invocações em andamento mantêm os objetos antigos
+        self.agentes_config = agentes_config
+        self.specialist_agents = specialist_agents
+        self.handoffs = handoffs
+        self.keyword_router = keyword_router
+        
+        logger.info(f"🔁 Configuração aplicada | Novos: {added} | Removidos: {removed} | Alterados: {changed} | Handoffs recriados: {rebuild_handoffs}")
+        return {
+            "added": added,
+            "removed": removed,
+            "changed": changed,
+            "handoffs_rebuilt": rebuild_handoffs
+        }
+    
+    def _create_handoff_orchestration(self, session: ConversationSession) -> HandoffOrchestration:
+        """Cria a orquestração com o callback ligado à sessão (invocações concorrentes ficam isoladas)"""
         all_agents = [self.triage_agent] + list(self.specialist_agents.values())
         
-        self.handoff_orchestration = HandoffOrchestration(
+        return HandoffOrchestration(
             members=all_agents,
-            handoffs=handoffs,
-            agent_response_callback=self._agent_response_callback
+            handoffs=self.handoffs,
+            agent_response_callback=partial(self._agent_response_callback, session),
+            streaming_agent_response_callback=partial(self._streaming_response_callback, session)
         )
     
-    def _agent_response_callback(self, message: ChatMessageContent) -> None:
+    def get_session(self, session_id: Optional[str] = None) -> ConversationSession:
+        """Retorna (ou cria) o estado da sessão, carregando o histórico do LRU de conversas"""
+        session_id = session_id or DEFAULT_SESSION_ID
+        memory_manager = self.conversations.get_session(session_id)
+        
+        session = self._sessions.get(session_id)
+        if session is None or session.memory_manager is not memory_manager:
+            session = ConversationSession(session_id, memory_manager)
+            self._sessions[session_id] = session
+        return session
+    
+    def _drop_session(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+    
+    def _session_in_use(self, session_id: str) -> bool:
+        """Sessão com mensagem em processamento (ou na fila do lock) ou resumo em andamento"""
+        session = self._sessions.get(session_id)
+        if session is not None and session.lock.locked():
+            return True
+        return bool(self.summarizer and self.summarizer.is_running(session_id))
+    
+    @property
+    def memory_manager(self) -> ChatHistoryManager:
+        """Histórico da sessão padrão (uso pelo CLI)"""
+        return self.get_session().memory_manager
+    
+    def _agent_response_callback(self, session: ConversationSession, message: ChatMessageContent) -> None:
         # Adicionar mensagem ao histórico principal
-        self.memory_manager.add_message(message)
+        session.memory_manager.add_message(message)
         
         # Salvar histórico automaticamente após cada mensagem
         try:
-            self.memory_manager.save_history()
+            session.memory_manager.save_history()
             logger.debug(f"💾 Histórico salvo automaticamente após mensagem de {message.name}")
         except Exception as e:
             logger.warning(f"⚠️ Erro ao salvar histórico: {e}")
         
-        # Atualizar o histórico na orquestração para o próximo handoff
-        if hasattr(self.handoff_orchestration, '_history'):
-            self.handoff_orchestration._history = self.memory_manager.get_chat_history()
-        
         message_key = f"{message.name}:{message.content[:100]}"
-        if not hasattr(self, '_displayed_messages'):
-            self._displayed_messages = set()
         
         # Capturar respostas de agentes
         if (hasattr(message, 'role') and 
@@ -142,18 +247,12 @@ class TriageAgent:
             if message.name == "TriageAgent":
                 # TriageAgent só deve responder para OOS ou clarificações
                 # Detectar se está tentando fazer handoff textualmente
-                handoff_indicators = [
-                    'vou encaminhar', 'direcionando', 'transferindo', 'redirecionando',
-                    'aguarde um instante', 'setor responsável', 'especialista', 'departamento'
-                ]
-                
-                if (any(keyword in message.content.lower() for keyword in ['transfer', 'handoff', 'delegate', 'routing']) or
-                    any(indicator in message.content.lower() for indicator in handoff_indicators)):
+                if parece_handoff_textual(message.content):
                     logger.warning(f"🚫 TriageAgent tentou responder com handoff textual (ignorado): {message.content[:50]}...")
                     return
                 
                 # Resposta válida do TriageAgent (OOS ou clarificação)
-                self._last_agent_response = {
+                session.last_agent_response = {
                     "name": message.name,
                     "content": message.content
                 }
@@ -168,14 +267,14 @@ class TriageAgent:
                     return
                 
                 # Resposta válida de agente especialista
-                self._last_agent_response = {
+                session.last_agent_response = {
                     "name": message.name,
                     "content": message.content
                 }
                 logger.info(f"✅ Resposta capturada de {message.name}: {message.content[:50]}...")
         
-        if message_key not in self._displayed_messages:
-            self._displayed_messages.add(message_key)
+        if message_key not in session.displayed_messages:
+            session.displayed_messages.add(message_key)
             
             agent_name = message.name or "Sistema"
             content = message.content
@@ -187,8 +286,21 @@ class TriageAgent:
             if message.name != "TriageAgent" or "transfer" in content.lower():
                 print(f"🤖 {agent_name}: {content}")
         
-        if len(self._displayed_messages) > 100:
-            self._displayed_messages.clear()
+        if len(session.displayed_messages) > 100:
+            session.displayed_messages.clear()
+    
+    def _streaming_response_callback(self, session: ConversationSession, chunk: StreamingChatMessageContent, is_final: bool) -> None:
+        """Repassa os tokens da orquestração para o cliente em streaming, sinalizando handoffs"""
+        if session.events is None:
+            return
+        
+        agent_name = chunk.name or "Sistema"
+        if agent_name != session.streaming_agent:
+            session.emit("handoff", from_agent=session.streaming_agent, to_agent=agent_name)
+            session.streaming_agent = agent_name
+        
+        if chunk.content:
+            session.emit("token", agent=agent_name, content=chunk.content)
     
     def iniciar_runtime(self):
         self.runtime = InProcessRuntime()
@@ -198,7 +310,47 @@ class TriageAgent:
         if self.runtime:
             await self.runtime.stop_when_idle()
     
-    async def processar_mensagem(self, mensagem: str) -> str:
+    async def processar_mensagem(self, mensagem: str, session_id: Optional[str] = None) -> str:
+        session = self.get_session(session_id)
+        async with session.lock:
+            result = await self._processar_mensagem(session, mensagem)
+        self._agendar_resumo(session)
+        return result
+    
+    def _agendar_resumo(self, session: ConversationSession) -> None:
+        """Resume em segundo plano as mensagens antigas de sessões longas"""
+        if self.summarizer:
+            self.summarizer.schedule(session.session_id, session.memory_manager)
+    
+    async def processar_mensagem_stream(self, mensagem: str, session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Processa a mensagem emitindo eventos à medida que acontecem:
+        preflight (veredictos), routing, handoff, token e, por último, done.
+        """
+        session = self.get_session(session_id)
+        async with session.lock:
+            queue: asyncio.Queue = asyncio.Queue()
+            session.events = queue
+            session.streaming_agent = None
+            task = asyncio.create_task(self._processar_mensagem(session, mensagem))
+            task.add_done_callback(lambda _: queue.put_nowait(None))
+            
+            try:
+                while True:
+                    event = await queue.get()
+                    if event is None:
+                        break
+                    yield event
+                
+                yield {"event": "done", "data": {"response": task.result()}}
+            finally:
+                # Cliente desconectou: a mensagem termina de ser processada, sem streaming
+                session.events = None
+                if not task.done():
+                    await task
+                self._agendar_resumo(session)
+    
+    async def _processar_mensagem(self, session: ConversationSession, mensagem: str) -> str:
         import time
         start_time = time.time()
         
@@ -206,34 +358,40 @@ class TriageAgent:
             if not self.runtime:
                 self.iniciar_runtime()
 
-            self._last_agent_response = None
+            session.last_agent_response = None
+            session.last_performance_metrics = {}
 
-            # Tempo de análise de guardrails
-            guardrail_start = time.time()
-            guardrail_result = self.guardrails.analisar_mensagem(mensagem)
-            guardrail_time = round(time.time() - guardrail_start, 3)
+            # Guardrails e moderação em paralelo (pre-flight)
+            preflight_result = await self.preflight.analisar(mensagem)
+            preflight_time = preflight_result.total_time
+            session.last_performance_metrics = {"preflight": preflight_result.to_metrics()}
+            session.emit(
+                "preflight",
+                blocked=preflight_result.blocked,
+                blocked_by=preflight_result.blocked_by,
+                guardrail=(preflight_result.guardrail_result.guardrail_name
+                           if preflight_result.guardrail_result is not None else None),
+                total_time=preflight_time
+            )
             
-            if guardrail_result.blocked:
+            if preflight_result.guardrail_result is not None:
+                guardrail_result = preflight_result.guardrail_result
                 total_time = round(time.time() - start_time, 3)
-                logger.info(f"⏱️ Guardrails: {guardrail_time}s | Total: {total_time}s (BLOQUEADO)")
+                logger.info(f"⏱️ Pre-flight: {preflight_time}s | Total: {total_time}s (BLOQUEADO)")
                 
                 blocked_message = ChatMessageContent(
                     role=AuthorRole.ASSISTANT,
                     content=f"⛔ Sua mensagem foi bloqueada por regras de segurança ({guardrail_result.guardrail_name}): {guardrail_result.reason}",
                     name="Sistema"
                 )
-                self.memory_manager.add_message(blocked_message)
+                session.memory_manager.add_message(blocked_message)
                 print(f"🤖 Sistema: {blocked_message.content}")
                 return blocked_message.content
-
-            # Tempo de análise de moderação
-            moderation_start = time.time()
-            moderation_result = self.moderator.analisar_mensagem(mensagem)
-            moderation_time = round(time.time() - moderation_start, 3)
             
-            if moderation_result.flagged:
+            if preflight_result.moderation_result is not None:
+                moderation_result = preflight_result.moderation_result
                 total_time = round(time.time() - start_time, 3)
-                logger.warning(f"⏱️ Moderação: {moderation_time}s | Total: {total_time}s | 🛑 Mensagem bloqueada por moderação")
+                logger.warning(f"⏱️ Pre-flight: {preflight_time}s | Total: {total_time}s | 🛑 Mensagem bloqueada por moderação")
                 
                 categorias = [k for k, v in moderation_result.categories.items() if v]
                 
@@ -242,7 +400,7 @@ class TriageAgent:
                     content=f"⚠️ Conteúdo sensível detectado ({', '.join(categorias)}). A mensagem foi bloqueada.",
                     name="Sistema"
                 )
-                self.memory_manager.add_message(blocked_message)
+                session.memory_manager.add_message(blocked_message)
                 print(f"🤖 Sistema: {blocked_message.content}")
                 
                 return blocked_message.content
@@ -252,91 +410,73 @@ class TriageAgent:
                 content=mensagem
             )
             
-            self.memory_manager.add_message(user_message)
+            session.memory_manager.add_message(user_message)
             
             # Tempo de criação de contexto
             context_start = time.time()
-            context_summary = self._create_context_summary()
+            context_summary = self._create_context_summary(session.memory_manager, self._context_budget(self.triage_agent.name))
             enhanced_message = f"{context_summary}\n\nUsuário atual: {mensagem}"
             context_time = round(time.time() - context_start, 3)
+            session.last_performance_metrics["context_time"] = context_time
+            session.last_performance_metrics["context"] = {
+                **session.memory_manager.context_window.last_stats,
+                "build_ms": round(context_time * 1000, 3),
+                "tokenizer": self.token_counter.backend
+            }
             
-            print(f"📋 Processando com contexto resumido ({len(self.memory_manager.get_history())} mensagens no histórico)")
-            print(f"🔍 Contexto enviado: {len(context_summary)} caracteres")
-            
-            # Detectar palavras-chave para forçar handoff direto (evitar TriageAgent responder)
-            tech_keywords = ['senha', 'email', 'e-mail', 'login', 'acesso', 'cadastrado', 'redefinir']
-            hr_keywords = ['benefício', 'férias', 'licença', 'rh', 'recursos humanos']
-            flight_keywords = ['voo', 'assento', 'reserva', 'cancelar', 'status']
-            
-            mensagem_lower = mensagem.lower()
+            print(f"📋 Processando com contexto resumido ({session.memory_manager.message_count()} mensagens no histórico)")
+            print(f"🔍 Contexto enviado: {session.memory_manager.context_window.last_stats.get('tokens', 0)} tokens")
             
-            # Forçar handoff direto baseado em palavras-chave
-            if any(keyword in mensagem_lower for keyword in tech_keywords):
-                logger.info("🎯 Detectado problema técnico - forçando handoff direto para TechSupportAgent")
-                fallback_result = await self._force_handoff_to_agent("TechSupportAgent", mensagem)
-                if fallback_result:
-                    total_time = round(time.time() - start_time, 3)
-                    logger.info(f"⏱️ DIRETO TECH - Total: {total_time}s")
-                    return fallback_result
-                    
-            elif any(keyword in mensagem_lower for keyword in hr_keywords):
-                logger.info("🎯 Detectado consulta RH - forçando handoff direto para HRAgent")
-                fallback_result = await self._force_handoff_to_agent("HRAgent", mensagem)
+            # Roteamento por palavras-chave/padrões da configuração dos agentes (uma passada)
+            keyword_agent = self.keyword_router.match(mensagem)
+            if keyword_agent:
+                logger.info(f"🎯 Palavra-chave de {keyword_agent} detectada - forçando handoff direto")
+                fallback_result = await self._force_handoff_to_agent(session, keyword_agent, mensagem)
                 if fallback_result:
                     total_time = round(time.time() - start_time, 3)
-                    logger.info(f"⏱️ DIRETO HR - Total: {total_time}s")
-                    return fallback_result
-                    
-            elif any(keyword in mensagem_lower for keyword in flight_keywords):
-                # Determinar se é SeatBooking ou FlightStatus
-                if any(word in mensagem_lower for word in ['assento', 'trocar', 'alterar']):
-                    logger.info("🎯 Detectado troca de assento - forçando handoff direto para SeatBookingAgent")
-                    fallback_result = await self._force_handoff_to_agent("SeatBookingAgent", mensagem)
-                else:
-                    logger.info("🎯 Detectado consulta voo - forçando handoff direto para FlightStatusAgent")
-                    fallback_result = await self._force_handoff_to_agent("FlightStatusAgent", mensagem)
-                    
-                if fallback_result:
-                    total_time = round(time.time() - start_time, 3)
-                    logger.info(f"⏱️ DIRETO FLIGHT - Total: {total_time}s")
+                    logger.info(f"⏱️ DIRETO {keyword_agent} - Total: {total_time}s")
                     return fallback_result
             
             # Verificar se deve manter continuidade com agente atual
-            stick_with_agent = self._should_stick_with_current_agent()
+            stick_with_agent = self._should_stick_with_current_agent(session.memory_manager)
             if stick_with_agent:
                 logger.info(f"🔗 Forçando continuidade com {stick_with_agent}")
                 # Usar apenas a mensagem atual, não o enhanced_message
                 # O agente receberá seu contexto específico das últimas mensagens
-                fallback_result = await self._force_handoff_to_agent(stick_with_agent, mensagem)
+                fallback_result = await self._force_handoff_to_agent(session, stick_with_agent, mensagem)
                 if fallback_result:
                     total_time = round(time.time() - start_time, 3)
                     logger.info(f"⏱️ CONTINUIDADE - Total: {total_time}s | Agent: {stick_with_agent}")
                     return fallback_result
             
+            # Roteamento local por similaridade: evita o salto de triagem por LLM quando confiante
+            if self.router:
+                decision = self.router.route(mensagem)
+                session.last_performance_metrics["routing"] = decision.to_metrics()
+                if decision.agent in self.specialist_agents:
+                    logger.info(f"🎯 Roteador local: {decision.agent} (confiança {decision.confidence:.2f})")
+                    fallback_result = await self._force_handoff_to_agent(session, decision.agent, mensagem)
+                    if fallback_result:
+                        total_time = round(time.time() - start_time, 3)
+                        logger.info(f"⏱️ FAST PATH - Total: {total_time}s | Roteamento: {decision.latency * 1000:.2f}ms | Agent: {decision.agent}")
+                        return fallback_result
+            
             # Tempo de processamento do agente
             agent_start = time.time()
+            session.emit("routing", agent="TriageAgent", strategy="orchestration")
             
-            # Tentar passar contexto completo para a orquestração
-            try:
-                chat_history = self.memory_manager.get_chat_history()
-                orchestration_result = await asyncio.wait_for(
-                    self.handoff_orchestration.invoke(
-                        task=enhanced_message,
-                        runtime=self.runtime,
-                        history=chat_history  # Tentar passar histórico completo
-                    ),
-                    timeout=25.0
-                )
-            except TypeError:
-                # Se history não for suportado, usar apenas a mensagem enhanced
-                orchestration_result = await asyncio.wait_for(
-                    self.handoff_orchestration.invoke(
-                        task=enhanced_message,
-                        runtime=self.runtime
-                    ),
-                    timeout=25.0
-                )
+            # O contexto (resumos + mensagens recentes + entidades, dentro do
+            # orçamento) vai só no enhanced_message: invoke() não recebe histórico
+            handoff_orchestration = self._create_handoff_orchestration(session)
+            orchestration_result = await asyncio.wait_for(
+                handoff_orchestration.invoke(
+                    task=enhanced_message,
+                    runtime=self.runtime
+                ),
+                timeout=25.0
+            )
             agent_time = round(time.time() - agent_start, 3)
+            session.last_performance_metrics["agent_time"] = agent_time
             
             result = await orchestration_result.get()
             
@@ -344,13 +484,13 @@ class TriageAgent:
             total_time = round(time.time() - start_time, 3)
             
             # Log detalhado de performance
-            agent_used = getattr(self, '_last_agent_response', {}).get('name', 'Unknown')
-            logger.info(f"⏱️ PERFORMANCE - Total: {total_time}s | Guardrails: {guardrail_time}s | Moderação: {moderation_time}s | Contexto: {context_time}s | Agente: {agent_time}s | Agent: {agent_used}")
+            agent_used = (session.last_agent_response or {}).get('name', 'Unknown')
+            logger.info(f"⏱️ PERFORMANCE - Total: {total_time}s | Pre-flight: {preflight_time}s | Contexto: {context_time}s | Agente: {agent_time}s | Agent: {agent_used}")
             
             # Verificar se houve resposta de agente especialista
-            if hasattr(self, '_last_agent_response') and self._last_agent_response:
-                response_agent = self._last_agent_response['name']
-                response_content = self._last_agent_response['content']
+            if session.last_agent_response:
+                response_agent = session.last_agent_response['name']
+                response_content = session.last_agent_response['content']
                 
                 if response_agent != "TriageAgent":
                     # Verificar se é resposta OOS de agente especialista e interceptar
@@ -365,7 +505,7 @@ class TriageAgent:
                             content=oos_response,
                             name="TriageAgent"
                         )
-                        self.memory_manager.add_message(triage_message)
+                        session.memory_manager.add_message(triage_message)
                         
                         return oos_response
                     
@@ -375,28 +515,15 @@ class TriageAgent:
                     # TriageAgent respondeu - verificar se é apropriado
                     logger.info(f"🎯 TriageAgent respondeu: {response_content[:100]}...")
                     
-                    # Detectar se o TriageAgent está tentando responder algo que deveria ser handoff
-                    handoff_indicators = [
-                        'vou encaminhar',
-                        'direcionando',
-                        'transferindo',
-                        'redirecionando',
-                        'aguarde um instante',
-                        'setor responsável',
-                        'suporte técnico',
-                        'especialista',
-                        'departamento'
-                    ]
-                    
                     # Se contém indicadores de handoff OU palavras técnicas de handoff
-                    if (any(keyword in response_content.lower() for keyword in ['transfer', 'handoff', 'delegate', 'routing']) or
-                        any(indicator in response_content.lower() for indicator in handoff_indicators)):
+                    if parece_handoff_textual(response_content, incluir_suporte=True):
                         logger.warning(f"🚫 TriageAgent tentou responder em vez de fazer handoff (ignorado): {response_content[:50]}...")
                         
-                        # Forçar handoff para TechSupportAgent se menciona problemas técnicos
-                        if any(tech_word in response_content.lower() for tech_word in ['senha', 'email', 'acesso', 'login', 'suporte técnico']):
-                            logger.info("🔄 Forçando handoff para TechSupportAgent...")
-                            fallback_result = await self._force_handoff_to_agent("TechSupportAgent", mensagem)
+                        # Forçar handoff se a resposta menciona o tema de algum agente
+                        target_agent = self.keyword_router.match(response_content)
+                        if target_agent:
+                            logger.info(f"🔄 Forçando handoff para {target_agent}...")
+                            fallback_result = await self._force_handoff_to_agent(session, target_agent, mensagem)
                             if fallback_result:
                                 return fallback_result
                         
@@ -409,7 +536,7 @@ class TriageAgent:
             result_str = str(result) if result else ""
             
             # Se result contém palavras de handoff, é falha na orquestração
-            if result_str and any(keyword in result_str.lower() for keyword in ['transfer', 'handoff', 'delegate']):
+            if result_str and menciona_handoff(result_str):
                 logger.warning(f"🚫 TriageAgent tentou responder (ignorado): {result_str[:50]}...")
                 return "Desculpe, não consegui encontrar informações sobre isso. Posso ajudá-lo com questões relacionadas a voos, suporte técnico, recursos humanos ou outras áreas disponíveis."
             
@@ -418,8 +545,8 @@ class TriageAgent:
             
             # Salvar histórico antes de retornar
             try:
-                self.memory_manager.save_history()
-                logger.info(f"💾 Histórico salvo com sucesso ({self.memory_manager.message_count()} mensagens)")
+                session.memory_manager.save_history()
+                logger.info(f"💾 Histórico salvo com sucesso ({session.memory_manager.message_count()} mensagens)")
             except Exception as e:
                 logger.warning(f"⚠️ Erro ao salvar histórico final: {e}")
             
@@ -460,106 +587,114 @@ class TriageAgent:
         
         return error_msg
     
-    def _create_context_summary(self) -> str:
-        recent_messages = self.memory_manager.get_recent_messages(count=15)  # Aumentado de 6 para 15 mensagens
-        
-        if len(recent_messages) <= 1:
-            return "[CONTEXTO: Primeira interação]"
+    def _context_budget(self, agent_name: str) -> int:
+        for config in self.agentes_config:
+            if config["name"] == agent_name:
+                settings = config.get("settings") or {}
+                return int(settings.get("context_token_budget", self.context_budget))
+        return self.context_budget
+    
+    def _create_context_summary(self, memory_manager: ChatHistoryManager, budget: Optional[int] = None) -> str:
+        """Mensagens recentes + entidades dentro do orçamento de tokens, mantido incrementalmente pelo histórico"""
+        return memory_manager.context_window.summary(budget or self.context_budget)
+    
+    def _build_agent_context(self, memory_manager: ChatHistoryManager, agent_name: str, message: str) -> tuple:
+        """Contexto do handoff direto: entidades + últimas mensagens do agente, dentro do orçamento dele"""
+        budget = self._context_budget(agent_name)
+        counter = self.token_counter
         
-        # Extrair informações importantes já mencionadas na conversa
-        important_info = self._extract_important_context(recent_messages)
+        current = f"[MENSAGEM ATUAL DO USUÁRIO:]\n{message}"
+        used = counter.count(current)
         
         context_parts = []
-        for msg in recent_messages[-12:]:  # Aumentado de 5 para 12 mensagens
-            role = "Usuário" if msg.role.value == "user" else f"Assistente({msg.name or 'Sistema'})"
-            # Aumentado limite de caracteres de 100 para 300 para preservar mais contexto
-            content = str(msg.content)[:300] + "..." if len(str(msg.content)) > 300 else str(msg.content)
-            context_parts.append(f"- {role}: {content}")
-        
-        context = "\n".join(context_parts)
-        
-        # Adicionar informações importantes extraídas
-        final_context = f"[CONTEXTO DA CONVERSA:\n{context}\n"
+        important_info = memory_manager.entities.summary()
         if important_info:
-            final_context += f"\nINFORMAÇÕES IMPORTANTES JÁ FORNECIDAS:\n{important_info}\n"
-        final_context += "]"
-        
-        return final_context
+            entities_block = counter.truncate(f"[INFORMAÇÕES IMPORTANTES JÁ FORNECIDAS:]\n{important_info}\n", max(budget - used, 0))
+            if entities_block:
+                context_parts.append(entities_block)
+                used += counter.count(entities_block)
+        
+        recent_agent_messages = memory_manager.get_recent_messages_by_agent(agent_name, count=20)
+        entries = []
+        for msg in reversed(recent_agent_messages):
+            line = f"Você disse: {msg.content}"
+            entries.append((line, counter.count(line) + 1))
+        lines, lines_tokens = empacotar(entries, budget - used - 12, counter)
+        
+        if lines:
+            context_parts.append(f"[SUAS ÚLTIMAS {len(lines)} MENSAGENS:]")
+            context_parts.extend(lines)
+            context_parts.append("")
+            used += lines_tokens + 12
+        
+        context_parts.append(current)
+        stats = {"tokens": used, "budget": budget, "messages": len(lines)}
+        return "\n".join(context_parts), stats
     
-    def _extract_important_context(self, messages) -> str:
-        """Extrai informações importantes que já foram mencionadas na conversa"""
-        important_data = []
-        
-        for msg in messages:
-            content_upper = str(msg.content).upper()
-            content_lower = str(msg.content).lower()
-            
-            # Detectar números de voo
-            import re
-            flight_numbers = re.findall(r'\b[A-Z]{2}\d{3,4}\b', content_upper)
-            important_data.extend(f"Voo: {flight}" for flight in flight_numbers if f"Voo: {flight}" not in important_data)
-            
-            # Detectar assentos
-            seats = re.findall(r'\b\d{1,2}[A-F]\b', content_upper)
-            important_data.extend(f"Assento: {seat}" for seat in seats if f"Assento: {seat}" not in important_data)
-            
-            # Detectar tipos de solicitação
-            if any(word in content_lower for word in ['cancelar', 'cancelamento']) and "Solicitação: Cancelamento" not in important_data:
-                important_data.append("Solicitação: Cancelamento")
-            
-            if any(word in content_lower for word in ['trocar', 'mudar', 'alterar']) and 'assento' in content_lower and "Solicitação: Troca de assento" not in important_data:
-                important_data.append("Solicitação: Troca de assento")
-        
-        return "\n".join(f"- {info}" for info in important_data)
+    def obter_historico(self, session_id: Optional[str] = None, limit: Optional[int] = None) -> list[MessageRecord]:
+        """Retorna o histórico da conversa (as últimas `limit` mensagens, se informado)"""
+        memory_manager = self.get_session(session_id).memory_manager
+        if limit:
+            return memory_manager.get_recent_messages(limit)
+        return memory_manager.get_history()
+    
+    def obter_pagina_historico(self, session_id: Optional[str] = None, limit: int = 50,
+                               before: Optional[int] = None, after: Optional[int] = None):
+        """Página do histórico por cursor (ids = first_id + posição da mensagem na sessão)"""
+        return self.get_session(session_id).memory_manager.get_page(limit, before=before, after=after)
     
-    def obter_historico(self) -> list[ChatMessageContent]:
-        """Retorna o histórico completo da conversa"""
-        return self.memory_manager.get_history()
+    def tamanho_historico(self, session_id: Optional[str] = None) -> int:
+        """Quantidade de mensagens da sessão"""
+        return self.get_session(session_id).memory_manager.message_count()
     
-    def limpar_historico(self):
+    def primeiro_id_historico(self, session_id: Optional[str] = None) -> int:
+        """Id da mensagem mais antiga da sessão (avança a cada limpeza do histórico)"""
+        return self.get_session(session_id).memory_manager.first_id
+    
+    def limpar_historico(self, session_id: Optional[str] = None):
         """Limpa o histórico da conversa"""
-        self.memory_manager.clear_history()
+        self.get_session(session_id).memory_manager.clear_history()
+    
+    def obter_metricas(self, session_id: Optional[str] = None) -> dict:
+        """Retorna as métricas de performance da última mensagem da sessão"""
+        return dict(self.get_session(session_id).last_performance_metrics)
     
-    async def _force_handoff_to_agent(self, agent_name: str, message: str) -> str:
+    async def _force_handoff_to_agent(self, session: ConversationSession, agent_name: str, message: str) -> str:
         """Força handoff para um agente específico usando contexto das últimas mensagens dele"""
         try:
             if agent_name in self.specialist_agents:
                 agent = self.specialist_agents[agent_name]
                 
-                # Obter últimas 5 mensagens deste agente específico usando memory manager
-                recent_agent_messages = self.memory_manager.get_recent_messages_by_agent(agent_name, count=5)
-                
-                # Montar contexto simples: últimas mensagens do agente + mensagem atual
-                context_parts = []
-                
-                if recent_agent_messages:
-                    context_parts.append(f"[SUAS ÚLTIMAS {len(recent_agent_messages)} MENSAGENS:]")
-                    for msg in recent_agent_messages:
-                        context_parts.append(f"Você disse: {msg.content}")
-                    context_parts.append("")
-                
-                context_parts.append("[MENSAGEM ATUAL DO USUÁRIO:]")
-                context_parts.append(message)
-                
-                full_context = "\n".join(context_parts)
+                # Montar contexto: entidades + últimas mensagens do agente + mensagem atual, dentro do orçamento
+                context_start = time.perf_counter()
+                full_context, context_stats = self._build_agent_context(session.memory_manager, agent_name, message)
+                context_stats["build_ms"] = round((time.perf_counter() - context_start) * 1000, 3)
+                context_stats["tokenizer"] = self.token_counter.backend
+                session.last_performance_metrics["context"] = context_stats
                 
-                # Processar com contexto específico do agente
-                logger.info(f"🎯 Handoff para {agent_name} com {len(recent_agent_messages)} mensagens de contexto")
-                response = await agent.invoke(full_context)
+                # Processar com contexto específico do agente (tokens repassados ao streaming, se houver)
+                logger.info(f"🎯 Handoff para {agent_name} com {context_stats['messages']} mensagens de contexto ({context_stats['tokens']}/{context_stats['budget']} tokens)")
+                session.emit("routing", agent=agent_name, strategy="direct")
+                chunks = []
+                async for item in agent.invoke_stream(messages=full_context):
+                    if item.message.content:
+                        chunks.append(item.message.content)
+                        session.emit("token", agent=agent_name, content=item.message.content)
+                response = "".join(chunks)
                 
                 # Adicionar resposta ao histórico
                 response_message = ChatMessageContent(
                     role=AuthorRole.ASSISTANT,
-                    content=str(response),
+                    content=response,
                     name=agent_name
                 )
-                self.memory_manager.add_message(response_message)
+                session.memory_manager.add_message(response_message)
                 
                 # Salvar histórico no arquivo JSON
-                self.memory_manager.save_history()
-                logger.info(f"💾 Histórico salvo em {self.memory_manager.persist_file}")
+                session.memory_manager.save_history()
+                logger.info(f"💾 Histórico salvo em {session.memory_manager.persist_file}")
                 
-                return str(response)
+                return response
         except Exception as e:
             logger.error(f"Erro no handoff forçado para {agent_name}: {e}")
         return ""
@@ -583,9 +718,9 @@ class TriageAgent:
         
         return any(pattern in content_lower for pattern in oos_patterns)
     
-    def _identify_active_agent(self) -> str:
+    def _identify_active_agent(self, memory_manager: ChatHistoryManager) -> str:
         """Identifica qual agente está ativo com base nas mensagens recentes"""
-        recent_messages = self.memory_manager.get_recent_messages(count=3)
+        recent_messages = memory_manager.get_recent_messages(count=3)
         
         # Procurar pelo último agente especialista que respondeu
         for msg in reversed(recent_messages):
@@ -598,16 +733,16 @@ class TriageAgent:
         
         return ""
     
-    def _should_stick_with_current_agent(self) -> str:
+    def _should_stick_with_current_agent(self, memory_manager: ChatHistoryManager) -> str:
         """Determina se deve continuar com o agente atual baseado no contexto"""
         # Identificar agente ativo
-        active_agent = self._identify_active_agent()
+        active_agent = self._identify_active_agent(memory_manager)
         
         if not active_agent:
             return ""
         
         # Usar get_recent_messages_by_agent para obter contexto específico
-        recent_agent_messages = self.memory_manager.get_recent_messages_by_agent(active_agent, count=2)
+        recent_agent_messages = memory_manager.get_recent_messages_by_agent(active_agent, count=2)
         
         # Verificar se o último agente fez uma pergunta que precisa de resposta
         for msg in recent_agent_messages: